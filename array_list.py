@@ -1,8 +1,30 @@
+import bisect
+import io
+import mmap
+import os
+import struct
+from array import array
+
+
 class ArrayList:
-    def __init__(self):
+    def __init__(self, typecode=None):
+        """
+        Growable array of boxed objects, or with an `array` module `typecode`
+        (e.g. 'd') of unboxed machine values, 8 bytes per float instead of a
+        pointer plus a float object.
+
+        A typed list exports its storage through `memoryview()` (and the
+        buffer protocol on Python 3.12+), so `struct`, NumPy and friends read
+        it without a copy. The storage is resized in place while no view is
+        exported; views taken before a growth keep pointing at the old buffer.
+        """
+        self.typecode = typecode
         self._capacity = 4
         self._size = 0
-        self._data = [None] * self._capacity
+        if typecode is None:
+            self._data = [None] * self._capacity
+        else:
+            self._data = array(typecode, bytes(self._capacity * array(typecode).itemsize))
 
     def append(self, value):
         if self._size == self._capacity:
@@ -10,6 +32,46 @@ class ArrayList:
         self._data[self._size] = value
         self._size += 1
 
+    def extend(self, values):
+        """
+        Appends all `values` with at most one resize. A typed list copies a
+        buffer of its own typecode, or a `bytes`/`bytearray` (or a view of
+        one) holding raw native values, with a single memcpy; anything else,
+        e.g. an array of another typecode, is converted element by element.
+        """
+        if self.typecode is not None:
+            try:
+                source = memoryview(values)
+            except TypeError:
+                source = None
+            if source is not None:
+                with source:
+                    if isinstance(source.obj, (bytes, bytearray)):
+                        # a strided view of the bytes is packed first
+                        self._extend_raw(source if source.c_contiguous else source.tobytes())
+                        return
+                    if source.format == self.typecode and source.c_contiguous:
+                        self._extend_raw(source)
+                        return
+            values = array(self.typecode, values)
+        elif not isinstance(values, list):
+            values = list(values)
+
+        self._reserve(self._size + len(values))
+        self._data[self._size:self._size + len(values)] = values
+        self._size += len(values)
+
+    def _extend_raw(self, buffer):
+        with memoryview(buffer) as source, source.cast("B") as raw:
+            itemsize = self._data.itemsize
+            if raw.nbytes % itemsize:
+                raise ValueError("Buffer size is not a multiple of item size")
+            count = raw.nbytes // itemsize
+            self._reserve(self._size + count)
+            with memoryview(self._data) as view, view.cast("B") as target:
+                target[self._size * itemsize:(self._size + count) * itemsize] = raw
+        self._size += count
+
     def get(self, index):
         if 0 <= index < self._size:
             return self._data[index]
@@ -28,13 +90,151 @@ class ArrayList:
         self._size -= 1
         return value
 
+    def insert(self, index, value):
+        """
+        Inserts `value` before `index`, shifting the tail with one slice copy; O(n)
+        """
+        if not 0 <= index <= self._size:
+            raise IndexError("Index out of bounds")
+        self._splice(index, index, [value])
+
+    def remove(self, value):
+        """
+        Removes the first occurrence of `value`, raises ValueError if there is none; O(n)
+        """
+        index = self._data.index(value, 0, self._size)
+        self._splice(index, index + 1, [])
+
+    def sort(self, key=None, reverse=False):
+        """
+        Sorts the elements in place; O(n log n)
+        """
+        values = sorted(self._data[:self._size], key=key, reverse=reverse)
+        self._data[:self._size] = values if self.typecode is None else array(self.typecode, values)
+
+    def bisect_left(self, value, key=None):
+        """
+        Returns the leftmost position to insert `value` keeping a sorted list sorted; O(log n)
+        """
+        return bisect.bisect_left(self._data, value, 0, self._size, key=key)
+
+    def bisect_right(self, value, key=None):
+        """
+        Returns the rightmost position to insert `value` keeping a sorted list sorted; O(log n)
+        """
+        return bisect.bisect_right(self._data, value, 0, self._size, key=key)
+
+    def reserve(self, capacity):
+        """
+        Grows the storage to hold at least `capacity` elements without further resizes.
+        """
+        if capacity > self._capacity:
+            self._resize(capacity)
+
+    def shrink_to_fit(self):
+        """
+        Releases the unused capacity.
+        """
+        if self._capacity > max(self._size, 1):
+            self._resize(max(self._size, 1))
+
+    def _values(self, values):
+        # a sequence `_data` slices can be assigned from
+        if self.typecode is not None:
+            return values if isinstance(values, array) and values.typecode == self.typecode else array(self.typecode, values)
+        return values if isinstance(values, list) else list(values)
+
+    def _splice(self, start, stop, values):
+        """
+        Replaces elements `start:stop` with `values`, moving the tail once.
+        Every copy keeps the length of `_data`, only `_reserve` resizes it.
+        """
+        values = self._values(values)
+        delta = len(values) - (stop - start)
+        if delta > 0:
+            self._reserve(self._size + delta)
+        if delta:
+            self._data[stop + delta:self._size + delta] = self._data[stop:self._size]
+        self._data[start:start + len(values)] = values
+        if delta < 0 and self.typecode is None:
+            # drop the references left past the new end
+            self._data[self._size + delta:self._size] = [None] * -delta
+        self._size += delta
+
+    def memoryview(self):
+        """
+        Returns a zero-copy view of the elements of a typed list.
+        """
+        if self.typecode is None:
+            raise TypeError("Only a typed ArrayList exports a buffer")
+        return memoryview(self._data)[:self._size]
+
+    def __buffer__(self, flags):
+        return self.memoryview()
+
+    def _reserve(self, size):
+        if size > self._capacity:
+            self._resize(max(size, 2 * self._capacity))
+
     def _resize(self, new_capacity):
-        new_data = [None] * new_capacity
-        for i in range(self._size):
-            new_data[i] = self._data[i]
-        self._data = new_data
+        """
+        Grows or shrinks the storage in place with one realloc and bulk copy.
+        """
+        if new_capacity < self._capacity:
+            filler = None
+        elif self.typecode is None:
+            filler = [None] * (new_capacity - self._capacity)
+        else:
+            filler = bytes((new_capacity - self._capacity) * self._data.itemsize)
+
+        try:
+            self._fit(self._data, new_capacity, filler)
+        except BufferError:
+            # an exported view pins the buffer, move to a copy
+            self._data = self._data[:new_capacity]
+            self._fit(self._data, new_capacity, filler)
         self._capacity = new_capacity
 
+    @staticmethod
+    def _fit(data, new_capacity, filler):
+        if filler is None:
+            del data[new_capacity:]
+        elif isinstance(filler, list):
+            data.extend(filler)
+        else:
+            data.frombytes(filler)
+
+    def _slice(self, key):
+        # `key` bounded to the elements; a negative stop means "past the front"
+        start, stop, step = key.indices(self._size)
+        if not len(range(start, stop, step)):
+            return slice(start, start, 1) if step == 1 else slice(0, 0, step)
+        return slice(start, stop if stop >= 0 else None, step)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            result = ArrayList(self.typecode)
+            result.extend(self._data[self._slice(key)])
+            return result
+        return self.get(key)
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, slice):
+            return self.set(key, value)
+
+        key = self._slice(key)
+        if key.step == 1:
+            self._splice(key.start, max(key.start, key.stop), value)
+        else:
+            # extended slices keep their length; checked here, an empty array
+            # assigned to an array's extended slice would delete it instead
+            values = self._values(value)
+            count = len(range(*key.indices(self._size)))
+            if len(values) != count:
+                raise ValueError(f"attempt to assign sequence of size {len(values)} "
+                                 f"to extended slice of size {count}")
+            self._data[key] = values
+
     def __len__(self):
         return self._size
 
@@ -43,7 +243,178 @@ class ArrayList:
             yield self._data[i]
 
 
+
+class MappedArrayList:
+    # magic, number of records, struct format of a record
+    _HEADER = struct.Struct("<8sQ48s")
+    _MAGIC = b"ARRLIST1"
+
+    def __init__(self, path, fmt="d", readonly=False, flush_every=None):
+        """
+        Append-friendly array of fixed-width records kept in a memory-mapped
+        file, for data sets larger than RAM. A record is packed with the
+        `struct` format `fmt` (little-endian unless it names a byte order);
+        `get` returns a scalar for single-field formats and a tuple otherwise.
+
+        The file is a 64-byte header with the record count followed by the
+        records, so reopening only maps it. It grows geometrically like
+        `ArrayList._resize`. Writes land in the page cache; `flush()` (or
+        every `flush_every` appends, and `close()`) syncs them to disk.
+        `readonly=True` maps the file for reading, so several processes can
+        share it; a reader sees records appended since via `refresh()`.
+        """
+        if fmt[0] not in "@=<>!":
+            fmt = "<" + fmt
+        self._record = struct.Struct(fmt)
+        self.readonly = readonly
+        self.flush_every = flush_every
+        self._unflushed = 0
+
+        exists = os.path.exists(path)
+        if readonly or exists:
+            self._file = open(path, "rb" if readonly else "r+b")
+        else:
+            self._file = open(path, "w+b")
+            self._file.truncate(self._HEADER.size + 4 * self._record.size)
+            self._file.write(self._HEADER.pack(self._MAGIC, 0, fmt.encode()))
+            self._file.flush()
+
+        self._map()
+        magic, self._size, stored_fmt = self._HEADER.unpack_from(self._mmap)
+        stored_fmt = stored_fmt.rstrip(b"\0").decode()
+        if magic != self._MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a MappedArrayList file")
+        if stored_fmt != fmt:
+            self.close()
+            raise ValueError(f"{path} holds {stored_fmt!r} records, not {fmt!r}")
+
+    def _map(self):
+        length = os.fstat(self._file.fileno()).st_size
+        access = mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE
+        self._mmap = mmap.mmap(self._file.fileno(), length, access=access)
+        self._capacity = (length - self._HEADER.size) // self._record.size
+
+    def _offset(self, index):
+        return self._HEADER.size + index * self._record.size
+
+    def _check_writable(self):
+        if self.readonly:
+            raise io.UnsupportedOperation("MappedArrayList is read-only")
+
+    def _resize(self, new_capacity):
+        """
+        Grows the file and maps it again; the old mapping stays valid until then.
+        """
+        self._mmap.close()
+        os.ftruncate(self._file.fileno(), self._offset(new_capacity))
+        self._map()
+
+    def _set_size(self, size):
+        # records are written before the count, so readers never see a partial one
+        self._size = size
+        struct.pack_into("<Q", self._mmap, len(self._MAGIC), size)
+
+    def _written(self, count):
+        self._unflushed += count
+        if self.flush_every is not None and self._unflushed >= self.flush_every:
+            self.flush()
+
+    def append(self, value):
+        self._check_writable()
+        if self._size == self._capacity:
+            self._resize(2 * self._capacity)
+        self._record.pack_into(self._mmap, self._offset(self._size), *self._fields(value))
+        self._set_size(self._size + 1)
+        self._written(1)
+
+    def extend(self, values):
+        """
+        Appends all `values` with at most one resize and one copy into the map.
+        """
+        self._check_writable()
+        data = b"".join(self._record.pack(*self._fields(value)) for value in values)
+        count = len(data) // self._record.size
+        if self._size + count > self._capacity:
+            self._resize(max(self._size + count, 2 * self._capacity))
+        self._mmap[self._offset(self._size):self._offset(self._size + count)] = data
+        self._set_size(self._size + count)
+        self._written(count)
+
+    def _fields(self, value):
+        return value if isinstance(value, tuple) else (value,)
+
+    def get(self, index):
+        if not 0 <= index < self._size and self.readonly:
+            self.refresh()
+        if 0 <= index < self._size:
+            fields = self._record.unpack_from(self._mmap, self._offset(index))
+            return fields if len(fields) > 1 else fields[0]
+        raise IndexError("Index out of bounds")
+
+    def set(self, index, value):
+        self._check_writable()
+        if 0 <= index < self._size:
+            self._record.pack_into(self._mmap, self._offset(index), *self._fields(value))
+            self._written(1)
+        else:
+            raise IndexError("Index out of bounds")
+
+    def pop(self):
+        self._check_writable()
+        if self._size == 0:
+            raise IndexError("pop from empty list")
+        value = self.get(self._size - 1)
+        self._set_size(self._size - 1)
+        return value
+
+    def refresh(self):
+        """
+        Picks up records another process appended since the file was mapped.
+        """
+        if os.fstat(self._file.fileno()).st_size != len(self._mmap):
+            self._mmap.close()
+            self._map()
+        self._size = self._HEADER.unpack_from(self._mmap)[1]
+
+    def flush(self):
+        """
+        Writes the dirty pages of the mapping to disk.
+        """
+        if not self.readonly:
+            self._mmap.flush()
+        self._unflushed = 0
+
+    def close(self):
+        if not self._mmap.closed:
+            self.flush()
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, index):
+        return self.get(index)
+
+    def __setitem__(self, index, value):
+        self.set(index, value)
+
+    def __len__(self):
+        if self.readonly:
+            self.refresh()
+        return self._size
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.get(i)
+
 if __name__ == "__main__":
+    import tempfile
+
     array_list = ArrayList()
     array_list.append(1)
     array_list.append(2)
@@ -51,5 +422,94 @@ if __name__ == "__main__":
     assert array_list.pop() == 3
     assert len(array_list) == 2
     assert list(array_list) == [1, 2]
+    array_list.extend(range(3, 10))
+    assert list(array_list) == list(range(1, 10))
+
+    floats = ArrayList("d")
+    for i in range(10):
+        floats.append(i / 2)
+    floats.extend(array("d", [7.5, 8.0]))
+    floats.extend(array("d", [0.25]).tobytes())
+    floats.extend([1, 2])
+    assert list(floats) == [i / 2 for i in range(10)] + [7.5, 8.0, 0.25, 1.0, 2.0]
+
+    # only bytes objects are taken as raw values, other buffers are converted
+    converted = ArrayList("d")
+    converted.extend(array("b", [1] * 8))
+    converted.extend(memoryview(array("d", range(6)))[::2])
+    converted.extend(memoryview(array("d", [0.25, 0.5, 0.75]).tobytes())[8:])
+    assert list(converted) == [1.0] * 8 + [0.0, 2.0, 4.0] + [0.5, 0.75]
+
+    view = floats.memoryview()
+    assert view.format == "d" and view.tolist() == list(floats)
+    floats.extend(range(100))  # grows while `view` pins the old buffer
+    assert view[0] == 0.0 and len(floats) == 115 and floats.get(114) == 99.0
+    view.release()
+    floats.set(0, 1.5)
+    assert floats.memoryview()[0] == 1.5
+
+    expected = list(floats)
+    floats.insert(0, -1.0)
+    floats.insert(len(floats), 200.0)
+    floats.remove(7.5)
+    expected = [-1.0] + expected + [200.0]
+    expected.remove(7.5)
+    floats[2:5] = [9.0]
+    floats[-3:] = array("d", [1.0, 2.0, 3.0, 4.0])
+    expected[2:5] = [9.0]
+    expected[-3:] = [1.0, 2.0, 3.0, 4.0]
+    floats[::10] = expected[::10] = [0.0] * len(expected[::10])
+    assert list(floats) == expected and list(floats[3:-1:2]) == expected[3:-1:2]
+    for values in ([], [1.0] * 1000):
+        try:
+            floats[::2] = values
+            assert False
+        except ValueError:
+            pass
+    assert list(floats) == expected and len(floats._data) == floats._capacity
+
+    floats.sort()
+    expected.sort()
+    assert list(floats) == expected
+    assert floats.bisect_left(2.0) == expected.index(2.0) and floats.bisect_right(1000.0) == len(expected)
+
+    words = ArrayList()
+    words.extend("delta alpha charlie bravo".split())
+    words.sort(key=len, reverse=True)
+    words.remove("alpha")
+    assert list(words) == ["charlie", "delta", "bravo"] and words._data[3] is None
+    words.reserve(100)
+    assert words._capacity == 100
+    words.shrink_to_fit()
+    assert words._capacity == 3 and list(words[::-1]) == ["bravo", "delta", "charlie"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "series.bin")
+        with MappedArrayList(path, "qd", flush_every=16) as series:
+            for i in range(10):
+                series.append((i, i / 2))
+            series.extend((i, -1.0) for i in range(10, 100))
+            series[3] = (3, 33.0)
+            assert series.pop() == (99, -1.0)
+            reader = MappedArrayList(path, "qd", readonly=True)
+            assert len(reader) == 99 and reader[3] == (3, 33.0)
+            series.extend((i, 0.0) for i in range(1000))
+            assert len(reader) == 1099 and reader[1098] == (999, 0.0)
+            reader.close()
+
+        with MappedArrayList(path, "qd", readonly=True) as series:
+            assert len(series) == 1099 and series.get(9) == (9, 4.5)
+            try:
+                series.append((0, 0.0))
+            except io.UnsupportedOperation:
+                pass
+            else:
+                raise AssertionError("read-only list accepted a write")
+        try:
+            MappedArrayList(path, "d")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("format mismatch not detected")
 
-    print("OK!")
\ No newline at end of file
+    print("OK!")
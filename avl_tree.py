@@ -1,13 +1,25 @@
 import collections
 
+import instrumentation
+import snapshot
+
 class Node:
-    def __init__(self, val = 0, left = None, right = None):
+    __slots__ = ("left", "right", "val", "value", "h", "size")
+
+    def __init__(self, val = 0, left = None, right = None, value = None):
+        # `val` is the ordering key, `value` the payload when used as a map
         self.left = left
         self.right = right
         self.val = val
+        self.value = value
         self.h = 1
+        # number of nodes in this subtree
+        self.size = 1
 
 class AVLTree:
+    # set on instances switched over by `enable_stats`
+    _stats = None
+
     def __init__(self):
         self.root = None
 
@@ -30,6 +42,12 @@ class AVLTree:
             return 0
         return node.h
 
+    @classmethod
+    def get_size(cls, node):
+        if node is None:
+            return 0
+        return node.size
+
     @classmethod
     def left_rotate(cls, node):
         if node is None:
@@ -41,6 +59,8 @@ class AVLTree:
         b.left = a
         a.h = 1 + max(cls.get_height(a.left), cls.get_height(a.right))
         b.h = 1 + max(cls.get_height(b.left), cls.get_height(b.right))
+        b.size = a.size
+        a.size = 1 + cls.get_size(a.left) + cls.get_size(a.right)
         return b
 
     @classmethod
@@ -54,49 +74,136 @@ class AVLTree:
         b.right = a
         a.h = 1 + max(cls.get_height(a.left), cls.get_height(a.right))
         b.h = 1 + max(cls.get_height(b.left), cls.get_height(b.right))
+        b.size = a.size
+        a.size = 1 + cls.get_size(a.left) + cls.get_size(a.right)
         return b
 
     @classmethod
-    def _rebalance_node(cls, node, val):
-        # O(1)
-        node.h = 1 + max(cls.get_height(node.left), cls.get_height(node.right))
+    def _rebalance_node(cls, node):
+        # O(1), cases are told apart by the child's balance, so it serves both insert and remove
+        left_h = node.left.h if node.left else 0
+        right_h = node.right.h if node.right else 0
+        node.h = 1 + max(left_h, right_h)
+        node.size = 1 + cls.get_size(node.left) + cls.get_size(node.right)
 
         # right-right case -> left rotate
-        balance = cls.get_balance(node)
-        if balance < -1 and val > node.right.val:
+        # right-left case -> right rotate the child, then left rotate
+        if left_h - right_h < -1:
+            if cls.get_balance(node.right) > 0:
+                node.right = cls.right_rotate(node.right)
             return cls.left_rotate(node)
 
         # left-left case -> right rotate
-        if balance > 1 and val < node.left.val:
+        # left-right case -> left rotate the child, then right rotate
+        if left_h - right_h > 1:
+            if cls.get_balance(node.left) < 0:
+                node.left = cls.left_rotate(node.left)
             return cls.right_rotate(node)
+        return node
 
-        # right-left case -> left-right rotate
-        if balance < -1 and val < node.right.val:
-            node.right = cls.right_rotate(node.right)
-            return cls.left_rotate(node)
+    def _rebalance_path(self, path):
+        """
+        Rebalances the nodes of a root-to-leaf `path` bottom-up. Stops as soon as
+        a subtree keeps its height, since nothing above it can change then.
+        Subtree sizes along the path must already be up to date.
+        """
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            old_h = node.h
+            new_node = self._rebalance_node(node)
+
+            if new_node is not node:
+                if i == 0:
+                    self.root = new_node
+                elif path[i - 1].left is node:
+                    path[i - 1].left = new_node
+                else:
+                    path[i - 1].right = new_node
 
-        # left-right case -> right-left rotate
-        if balance > 1 and val > node.left.val:
-            node.left = cls.left_rotate(node.left)
-            return cls.right_rotate(node)
-        return node
+            if new_node.h == old_h:
+                break
 
-    def insert(self, val):
-        # O(logN)
-        def _insert_dfs(node, val):
-            if node is None:
-                return Node(val)
+    @classmethod
+    def _join(cls, left, node, right):
+        """
+        Joins two subtrees and a detached middle node, all keys of `left` <
+        `node.val` < all keys of `right`. Hangs the lower tree off the spine of
+        the taller one and rebalances back up; O(|height difference| + 1).
+        """
+        left_h, right_h = cls.get_height(left), cls.get_height(right)
+
+        if left_h > right_h + 1:
+            path, cur = [], left
+            while cls.get_height(cur) > right_h + 1:
+                path.append(cur)
+                cur = cur.right
+            node.left, node.right = cur, right
+            cls._rebalance_node(node)
+            path[-1].right = node
+        elif right_h > left_h + 1:
+            path, cur = [], right
+            while cls.get_height(cur) > left_h + 1:
+                path.append(cur)
+                cur = cur.left
+            node.left, node.right = left, cur
+            cls._rebalance_node(node)
+            path[-1].left = node
+        else:
+            node.left, node.right = left, right
+            cls._rebalance_node(node)
+            return node
+
+        # sizes changed all the way up, so no early exit here
+        for i in range(len(path) - 1, 0, -1):
+            new_node = cls._rebalance_node(path[i])
+            if path[i - 1].left is path[i]:
+                path[i - 1].left = new_node
+            else:
+                path[i - 1].right = new_node
+        return cls._rebalance_node(path[0])
 
+    @classmethod
+    def _split(cls, node, val):
+        """
+        Splits a subtree into the keys < `val` and the keys >= `val`; O(log N)
+        """
+        if node is None:
+            return None, None
+        if val < node.val:
+            left, right = cls._split(node.left, val)
+            return left, cls._join(right, node, node.right)
+        if val > node.val:
+            left, right = cls._split(node.right, val)
+            return cls._join(node.left, node, left), right
+        return node.left, cls._join(None, node, node.right)
+
+    def insert(self, val, value=None):
+        # O(logN), an existing key gets its value replaced
+        node = self.root
+        if node is None:
+            self.root = Node(val, value=value)
+            return True
+
+        path = []
+        while node is not None:
+            path.append(node)
             if val < node.val:
-                node.left = _insert_dfs(node.left, val)
+                node = node.left
             elif val > node.val:
-                node.right = _insert_dfs(node.right, val)
+                node = node.right
             else:
-                return node
-
-            return self._rebalance_node(node, val)
-
-        self.root = _insert_dfs(self.root, val)
+                node.value = value
+                return True
+
+        parent = path[-1]
+        if val < parent.val:
+            parent.left = Node(val, value=value)
+        else:
+            parent.right = Node(val, value=value)
+        for node in path:
+            node.size += 1
+
+        self._rebalance_path(path)
         return True
 
     def get(self):
@@ -108,28 +215,323 @@ class AVLTree:
 
     def remove(self, val):
         # O(log N)
-        def remove_dfs(node, val):
-            if node is None:
-                return None
+        path = []
+        node = self.root
+        while node is not None and val != node.val:
+            path.append(node)
+            node = node.left if val < node.val else node.right
+
+        if node is None:
+            return
+
+        if node.left and node.right:
+            # found node with two children: take over the in-order successor's value
+            # and delete the successor, which has no left child
+            path.append(node)
+            min_node = node.right
+            while min_node.left:
+                path.append(min_node)
+                min_node = min_node.left
+            node.val = min_node.val
+            node.value = min_node.value
+            node = min_node
+
+        child = node.left or node.right
+        if not path:
+            self.root = child
+        elif path[-1].left is node:
+            path[-1].left = child
+        else:
+            path[-1].right = child
+        for node in path:
+            node.size -= 1
+
+        self._rebalance_path(path)
+
+    def _find(self, val):
+        node = self.root
+        while node is not None and val != node.val:
+            node = node.left if val < node.val else node.right
+        return node
 
+    def floor(self, val):
+        """
+        Returns the largest key <= `val`, or None; O(log N)
+        """
+        node, found = self.root, None
+        while node is not None:
             if val < node.val:
-                node.left = remove_dfs(node.left, val)
+                node = node.left
+            else:
+                found = node
+                if val == node.val:
+                    break
+                node = node.right
+        return found.val if found else None
+
+    def ceiling(self, val):
+        """
+        Returns the smallest key >= `val`, or None; O(log N)
+        """
+        node, found = self.root, None
+        while node is not None:
+            if val > node.val:
+                node = node.right
+            else:
+                found = node
+                if val == node.val:
+                    break
+                node = node.left
+        return found.val if found else None
+
+    def min(self):
+        # O(log N)
+        return self.min_left_node(self.root).val if self.root else None
+
+    def max(self):
+        # O(log N)
+        node = self.root
+        if node is None:
+            return None
+        while node.right:
+            node = node.right
+        return node.val
+
+    def range(self, lo=None, hi=None):
+        """
+        Lazily yields `(key, value)` pairs with lo <= key < hi in key order,
+        a None bound is open; O(log N + k) with an O(log N) stack.
+        """
+        stack = []
+        node = self.root
+        while node is not None:
+            # descend to the first key >= lo, stacking the nodes still to visit
+            if lo is not None and node.val < lo:
+                node = node.right
+            else:
+                stack.append(node)
+                node = node.left
+
+        while stack:
+            node = stack.pop()
+            if hi is not None and not node.val < hi:
+                return
+            yield (node.val, node.value)
+
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
+
+    def items(self):
+        return self.range()
+
+    def rank(self, val):
+        """
+        Returns the number of keys < `val`; O(log N)
+        """
+        rank = 0
+        node = self.root
+        while node is not None:
+            if val < node.val:
+                node = node.left
             elif val > node.val:
-                node.right = remove_dfs(node.right, val)
+                rank += 1 + self.get_size(node.left)
+                node = node.right
             else:
-                # found node to delete
-                if not node.left:
-                    return node.right
-                elif not node.right:
-                    return node.left
-                else:
-                    min_node = self.min_left_node(node.right)
-                    node.val = min_node.val
-                    node.right = remove_dfs(node.right, min_node.val)
+                return rank + self.get_size(node.left)
+        return rank
+
+    def select(self, k):
+        """
+        Returns the k-th smallest key, counting from 0; O(log N)
+        """
+        if not 0 <= k < len(self):
+            raise IndexError("Index out of bounds")
+
+        node = self.root
+        while True:
+            left_size = self.get_size(node.left)
+            if k < left_size:
+                node = node.left
+            elif k > left_size:
+                k -= left_size + 1
+                node = node.right
+            else:
+                return node.val
+
+    def count_range(self, lo=None, hi=None):
+        """
+        Returns the number of keys with lo <= key < hi, a None bound is open; O(log N)
+        """
+        count = len(self) if hi is None else self.rank(hi)
+        if lo is not None:
+            count -= self.rank(lo)
+        return max(count, 0)
+
+    @classmethod
+    def from_sorted(cls, iterable):
+        """
+        Builds a perfectly balanced tree from ascending keys; O(N), no rotations.
+        Equal neighbouring keys are stored once.
+        """
+        return cls._build(list(iterable), None)
 
-            return self._rebalance_node(node, val)
+    @classmethod
+    def from_sorted_items(cls, items):
+        """
+        Builds a perfectly balanced tree from `(key, value)` pairs in ascending
+        key order; O(N). The last value of a repeated key wins.
+        """
+        items = list(items)
+        return cls._build([val for val, _ in items], [value for _, value in items])
+
+    @classmethod
+    def _build(cls, keys, values):
+        if any(not a < b for a, b in zip(keys, keys[1:])):
+            # slow path: drop repeated keys, keeping the last value
+            unique_keys, unique_values = [], []
+            for i, val in enumerate(keys):
+                if unique_keys and not unique_keys[-1] < val:
+                    if val < unique_keys[-1]:
+                        raise ValueError("Keys must be sorted")
+                    unique_values[-1] = values[i] if values is not None else None
+                    continue
+                unique_keys.append(val)
+                unique_values.append(values[i] if values is not None else None)
+            keys, values = unique_keys, unique_values
+
+        if values is None:
+            nodes = [Node(val) for val in keys]
+        else:
+            nodes = [Node(val, value=value) for val, value in zip(keys, values)]
+
+        def build(lo, hi):
+            # nodes[lo:hi] -> subtree rooted at the middle one, hi > lo
+            mid = (lo + hi) // 2
+            node = nodes[mid]
+            h = 0
+            if lo < mid:
+                node.left = build(lo, mid)
+                h = node.left.h
+            if mid + 1 < hi:
+                node.right = build(mid + 1, hi)
+                h = max(h, node.right.h)
+            node.h = h + 1
+            node.size = hi - lo
+            return node
+
+        tree = cls()
+        tree.root = build(0, len(nodes)) if nodes else None
+        return tree
+
+    def dump(self, fp):
+        """
+        Writes the `(key, value)` pairs in key order to the binary file `fp`; O(N)
+        """
+        snapshot.dump(fp, "AVLTree", None, len(self), self.items())
 
-        self.root = remove_dfs(self.root, val)
+    @classmethod
+    def load(cls, fp):
+        """
+        Rebuilds a tree written by `dump` in O(N) without rotations. Nodes are
+        built in order straight from the stream, so only one chunk of the file
+        and an O(log N) stack are held besides the tree itself.
+        """
+        _, count, entries = snapshot.load(fp, "AVLTree")
+        last = []
+
+        def build(n):
+            # the next n entries -> perfectly balanced subtree
+            if not n:
+                return None
+            left = build(n // 2)
+            val, value = next(entries)
+            if last and not last[0] < val:
+                raise ValueError("Keys must be sorted")
+            last[:] = [val]
+            node = Node(val, left, build(n - n // 2 - 1), value)
+            node.h = (left.h if left else 0) + 1
+            node.size = n
+            return node
+
+        tree = cls()
+        tree.root = build(count)
+        return tree
+
+    @staticmethod
+    def _merge(a, b, keep_a, keep_both, keep_b):
+        """
+        Walks two sorted `(key, value)` streams together and yields the pairs of
+        the requested kinds: keys only in `a`, in both (with `b`'s value), only in `b`.
+        """
+        a, b = iter(a), iter(b)
+        item_a, item_b = next(a, None), next(b, None)
+        while item_a is not None and item_b is not None:
+            if item_a[0] < item_b[0]:
+                if keep_a:
+                    yield item_a
+                item_a = next(a, None)
+            elif item_b[0] < item_a[0]:
+                if keep_b:
+                    yield item_b
+                item_b = next(b, None)
+            else:
+                if keep_both:
+                    yield item_b
+                item_a, item_b = next(a, None), next(b, None)
+
+        if keep_a and item_a is not None:
+            yield item_a
+            yield from a
+        if keep_b and item_b is not None:
+            yield item_b
+            yield from b
+
+    def union(self, other):
+        """
+        Returns a new tree with the keys of both trees, values of `other` winning; O(N + M)
+        """
+        return type(self).from_sorted_items(self._merge(self.items(), other.items(), True, True, True))
+
+    def intersection(self, other):
+        """
+        Returns a new tree with the keys present in both trees; O(N + M)
+        """
+        # `_merge` keeps the second stream's pair of a common key: pass this tree second
+        return type(self).from_sorted_items(self._merge(other.items(), self.items(), False, True, False))
+
+    def difference(self, other):
+        """
+        Returns a new tree with the keys of this tree missing from `other`; O(N + M)
+        """
+        return type(self).from_sorted_items(self._merge(self.items(), other.items(), True, False, False))
+
+    def split(self, val):
+        """
+        Moves the keys < `val` and the keys >= `val` into two new trees and
+        leaves this one empty; O(log N)
+        """
+        left, right = type(self)(), type(self)()
+        left.root, right.root = self._split(self.root, val)
+        self.root = None
+        return left, right
+
+    def join(self, other):
+        """
+        Moves every key of `other`, all of them greater than this tree's keys,
+        into this tree and leaves `other` empty; O(log N)
+        """
+        if other.root is None:
+            return self
+        if self.root is not None and not self.max() < other.min():
+            raise ValueError("Keys of the joined tree must be greater")
+
+        node = other.min_left_node(other.root)
+        other.remove(node.val)
+        self.root = self._join(self.root, Node(node.val, value=node.value), other.root)
+        other.root = None
+        return self
 
     def is_balanced(self, node=None):
         # O(log N)
@@ -149,6 +551,28 @@ class AVLTree:
         _, balanced = check(node)
         return balanced
 
+    def enable_stats(self, callback=None):
+        """
+        Starts counting rotations, see `stats`. Trees built from this one by
+        `split`, `union` and friends share its stats. The tree stays a bit
+        slower after `disable_stats`, see `instrumentation`.
+        """
+        instrumentation.enable(self, _AVLTreeStats, callback)
+
+    def disable_stats(self):
+        instrumentation.disable(self)
+
+    def stats(self):
+        """
+        Returns the size and the height against the optimum ceil(log2(N + 1)),
+        plus rotation counters while stats are enabled; O(1)
+        """
+        size = len(self)
+        result = {"size": size, "height": self.get_height(self.root), "optimal_height": size.bit_length()}
+        if self._stats is not None:
+            result.update(self._stats.snapshot())
+        return result
+
     def __repr__(self):
         # O(N)
         queue = collections.deque([self.root])
@@ -182,11 +606,47 @@ class AVLTree:
 
         return "\n".join(lines) + "\n"
 
+    def __getitem__(self, key):
+        node = self._find(key)
+        return node.value if node else None
+
+    def __setitem__(self, key, value):
+        self.insert(key, value)
+
+    def __delitem__(self, key):
+        self.remove(key)
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __len__(self):
+        return self.get_size(self.root)
+
+    def __iter__(self):
+        for key, _ in self.range():
+            yield key
+
     def _depth(self, node):
         if not node:
             return 0
         return 1 + max(self._depth(node.left), self._depth(node.right))
 
+
+class _AVLTreeStats:
+    """
+    Instrumented overrides put in front of a tree's class by `enable_stats`.
+    """
+
+    @classmethod
+    def left_rotate(cls, node):
+        cls._stats.count("rotations")
+        return super().left_rotate(node)
+
+    @classmethod
+    def right_rotate(cls, node):
+        cls._stats.count("rotations")
+        return super().right_rotate(node)
+
 if __name__ == "__main__":
     avl_tree = AVLTree()
 
@@ -214,3 +674,66 @@ if __name__ == "__main__":
     print(avl_tree.root.val)
     print(avl_tree.get_height(avl_tree.root.left), avl_tree.get_height(avl_tree.root.right))
 
+    import random
+    keys = list(range(2000))
+    random.shuffle(keys)
+    avl_tree = AVLTree()
+    for key in keys:
+        avl_tree.insert(key)
+    assert avl_tree.is_balanced() and avl_tree.root.h == avl_tree._depth(avl_tree.root) <= 15
+    for key in keys[:1500]:
+        avl_tree.remove(key)
+    assert avl_tree.is_balanced() and avl_tree.root.h == avl_tree._depth(avl_tree.root)
+    assert list(avl_tree) == sorted(keys[1500:]) and len(avl_tree) == 500
+
+    index = AVLTree()
+    for key in range(0, 100, 10):
+        index[key] = str(key)
+    index[50] = "fifty"
+    assert index[50] == "fifty" and index[55] is None and 40 in index and 45 not in index
+    assert index.floor(55) == 50 and index.floor(50) == 50 and index.floor(-1) is None
+    assert index.ceiling(55) == 60 and index.ceiling(90) == 90 and index.ceiling(91) is None
+    assert index.min() == 0 and index.max() == 90 and len(index) == 10
+    assert list(index.range(25, 60)) == [(30, "30"), (40, "40"), (50, "fifty")]
+    assert [key for key, _ in index.range(hi=20)] == [0, 10]
+    assert [key for key, _ in index.range(lo=85)] == [90]
+    del index[50]
+    assert list(index) == [0, 10, 20, 30, 40, 60, 70, 80, 90]
+    assert index.rank(0) == 0 and index.rank(45) == 5 and index.rank(60) == 5 and index.rank(100) == 9
+    assert [index.select(k) for k in range(len(index))] == list(index)
+    assert index.count_range(10, 70) == 5 and index.count_range(lo=65) == 3 and index.count_range(70, 10) == 0
+    median = index.select(len(index) // 2)
+    assert median == 40
+
+    evens = AVLTree.from_sorted(range(0, 20, 2))
+    threes = AVLTree.from_sorted_items((key, "three") for key in range(0, 20, 3))
+    assert evens.is_balanced() and len(evens) == 10 and evens.root.h == 4
+    assert list(evens.union(threes)) == sorted(set(range(0, 20, 2)) | set(range(0, 20, 3)))
+    assert evens.union(threes)[6] == "three"
+    assert list(evens.intersection(threes)) == [0, 6, 12, 18]
+    assert evens.intersection(threes)[6] is None and threes.intersection(evens)[6] == "three"
+    assert list(evens.difference(threes)) == [2, 4, 8, 10, 14, 16]
+
+    left, right = AVLTree.from_sorted(range(100)).split(37)
+    assert list(left) == list(range(37)) and list(right) == list(range(37, 100))
+    assert left.is_balanced() and right.is_balanced() and len(left) == 37
+    joined = left.join(right)
+    assert list(joined) == list(range(100)) and joined.is_balanced() and len(joined) == 100
+
+    import io
+
+    buffer = io.BytesIO()
+    tree = AVLTree.from_sorted_items((i, str(i)) for i in range(1000))
+    tree.dump(buffer)
+    buffer.seek(0)
+    loaded = AVLTree.load(buffer)
+    assert list(loaded.items()) == list(tree.items()) and loaded.is_balanced() and len(loaded) == 1000
+    assert loaded.rank(500) == 500 and loaded[999] == "999"
+
+    loaded.enable_stats()
+    for i in range(1000, 1100):
+        loaded.insert(i)
+    stats = loaded.stats()
+    assert stats["counters"]["rotations"] > 0 and stats["height"] <= stats["optimal_height"] + 1
+    print("OK!")
+
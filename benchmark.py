@@ -0,0 +1,967 @@
+"""
+Benchmarks for the data structures.
+
+    python benchmark.py [name ...] [-n N]
+    python benchmark.py --suite [target ...] [-n N] [--threads N] [--repeat N] [--json out.json] [--baseline base.json]
+
+The suite runs the same workloads against every structure and engine and
+reports throughput, p50/p99/p999 latency per operation and peak memory, each
+the median of `--repeat` runs. With `--baseline` it exits with status 1 if
+throughput or memory regressed past `--tolerance`, or single-threaded p99
+latency past the wider `--latency-tolerance`. Memory is the tracemalloc peak of the Python
+heap: it leaves out MappedArrayList's mapped file and ShardedHashMap's
+worker processes.
+"""
+import argparse
+import collections
+import heapq
+import importlib.util
+import itertools
+import io
+import json
+import os
+import pickle
+import platform
+import random
+import shutil
+import statistics
+import sysconfig
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from array import array
+
+from array_list import ArrayList, MappedArrayList
+from avl_tree import AVLTree
+from blocking import Empty
+from concurrent_hashmap import ConcurrentHashMap
+from executor import WorkStealingExecutor
+from hashmap import CompactHashMap, HashMap
+from linked_hashmap import LinkedHashMap
+from linked_list import DoublyLinkedList, LinkedList, UnrolledLinkedList
+from priority_queue import IndexedPriorityQueue, MinHeap, PriorityQueue
+from queue import BlockingQueue, LinkedQueue, Queue
+from sharded_hashmap import ShardedHashMap
+from stack import Stack, WorkStealingDeque
+
+
+def measure_memory(build):
+    """
+    Returns bytes allocated by `build()` and still alive once it returns.
+    """
+    tracemalloc.start()
+    try:
+        result = build()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return current
+
+
+def measure_rate(fn, ops):
+    """
+    Returns `fn()` throughput in ops/sec.
+    """
+    start = time.perf_counter()
+    fn()
+    return ops / (time.perf_counter() - start)
+
+
+def zipf_keys(n, universe, s=1.1):
+    """
+    Returns `n` keys from `range(universe)` where key k has weight 1 / (k + 1) ** s.
+    """
+    cum_weights = list(itertools.accumulate(1 / (k + 1) ** s for k in range(universe)))
+    keys = random.choices(range(universe), cum_weights=cum_weights, k=n)
+    # spread the hot keys over the key space
+    perm = list(range(universe))
+    random.shuffle(perm)
+    return [perm[k] for k in keys]
+
+
+def bench_hashmap(n):
+    keys = list(range(n))
+    random.shuffle(keys)
+
+    for engine in (HashMap, CompactHashMap):
+        def build():
+            hashmap = engine()
+            for key in keys:
+                hashmap.put(key, key)
+            return hashmap
+
+        memory = measure_memory(build)
+        hashmap = build()
+        lookups = measure_rate(lambda: [hashmap.get(key) for key in keys], n)
+        print(f"{engine.__name__:<16} {memory / n:8.1f} B/entry {lookups:12,.0f} lookups/s")
+
+
+class CollidingKey:
+    """
+    A key with a constant hash: every instance lands in the same bucket.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return 42
+
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and self.value == other.value
+
+    def __lt__(self, other):
+        return self.value < other.value if isinstance(other, CollidingKey) else NotImplemented
+
+
+class UnorderedCollidingKey:
+    """
+    Distinct hashes that all fall into bucket 0 of every table size, without `<`.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return self.value * ADVERSARIAL_STRIDE
+
+    def __eq__(self, other):
+        return isinstance(other, UnorderedCollidingKey) and self.value == other.value
+
+
+class ChainedHashMap(HashMap):
+    """
+    HashMap without tree bins, every bucket stays a linked chain.
+    """
+    TREEIFY_THRESHOLD = float("inf")
+
+
+def bench_treeify(n):
+    # chains make the colliding runs quadratic, keep them short
+    n = min(n, 5_000)
+    for key_type in (int, CollidingKey, UnorderedCollidingKey):
+        keys = [key_type(i) for i in random.sample(range(n), n)]
+        for engine in (ChainedHashMap, HashMap):
+            hashmap = engine()
+            puts = measure_rate(lambda: [hashmap.put(key, key) for key in keys], n)
+            gets = measure_rate(lambda: [hashmap.get(key) for key in keys], n)
+            bins = sum(hashmap.stats()["tree_bin_sizes"].values())
+            print(f"{key_type.__name__:<22} {engine.__name__:<15} {puts:12,.0f} puts/s {gets:12,.0f} gets/s"
+                  f" {bins:5} tree bins")
+
+
+class BucketLockedHashMap(HashMap):
+    """
+    The original ConcurrentHashMap design: a fixed table with one RLock per bucket.
+    """
+
+    def __init__(self, capacity=10):
+        super().__init__(capacity=capacity, load_factor=float("inf"))
+        self.locks = [threading.RLock() for _ in range(self.capacity)]
+
+    def put(self, key, value):
+        with self.locks[self._hash(key)]:
+            return super().put(key, value)
+
+    def get(self, key):
+        with self.locks[self._hash(key)]:
+            return super().get(key)
+
+
+def measure_threaded_rate(worker, threads, ops_per_thread):
+    """
+    Returns the combined ops/sec of `threads` threads running `worker(i)`.
+    """
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return threads * ops_per_thread / (time.perf_counter() - start)
+
+
+def bench_concurrent_hashmap(n):
+    keys = list(range(n))
+    random.shuffle(keys)
+
+    for threads in (1, 4, 8):
+        ops = n // threads
+        for engine in (BucketLockedHashMap, ConcurrentHashMap):
+            hashmap = engine()
+
+            def worker(i):
+                # 10% writes: fresh keys of this thread's slice; 90% reads of any key
+                for j, key in enumerate(keys[i * ops:(i + 1) * ops]):
+                    if j % 10 == 0:
+                        hashmap.put(key, key)
+                    else:
+                        hashmap.get(keys[j])
+
+            rate = measure_threaded_rate(worker, threads, ops)
+            print(f"{engine.__name__:<20} {threads} threads {rate:12,.0f} ops/s")
+
+    items = [(key, key) for key in keys]
+    for batch in (1, 100, 10_000):
+        hashmap = ConcurrentHashMap()
+
+        def ingest():
+            for i in range(0, n, batch):
+                hashmap.put_all(items[i:i + batch])
+
+        rate = measure_rate(ingest, n)
+        print(f"ConcurrentHashMap.put_all batch={batch:<6} {rate:12,.0f} puts/s")
+
+
+def bench_sharded_hashmap(n):
+    # bulk counting: n events over n // 10 distinct keys, ingested in batches
+    events = [(random.randrange(n // 10), 1) for _ in range(n)]
+    batches = [events[i:i + 50_000] for i in range(0, n, 50_000)]
+
+    def count_in_process():
+        hashmap = HashMap()
+        for key, value in events:
+            old = hashmap.get(key)
+            hashmap.put(key, value if old is None else old + value)
+
+    base = measure_rate(count_in_process, n)
+    print(f"{'HashMap':<24} {base:12,.0f} events/s")
+
+    shards = 1
+    while True:
+        with ShardedHashMap(shards=shards) as hashmap:
+            rate = measure_rate(lambda: [hashmap.aggregate(batch) for batch in batches], n)
+        print(f"{f'ShardedHashMap shards={shards}':<24} {rate:12,.0f} events/s  x{rate / base:.2f}")
+        if shards >= (os.cpu_count() or 1):
+            break
+        shards = min(shards * 2, os.cpu_count())
+
+
+class OrderedDictLRU:
+    """
+    The usual `collections.OrderedDict` LRU cache, as a reference point.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = collections.OrderedDict()
+
+    def get(self, key):
+        if key in self._data:
+            self._data.move_to_end(key)
+            return self._data[key]
+        return None
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+
+def bench_linked_hashmap(n):
+    universe = max(n // 10, 100)
+    keys = zipf_keys(n, universe)
+
+    for max_size in (universe // 100, universe // 10):
+        for engine in (OrderedDictLRU, LinkedHashMap):
+            if engine is LinkedHashMap:
+                cache = LinkedHashMap(access_order=True, max_size=max_size)
+            else:
+                cache = engine(max_size)
+            hits = 0
+
+            def run():
+                nonlocal hits
+                for key in keys:
+                    if cache.get(key) is None:
+                        cache.put(key, key)
+                    else:
+                        hits += 1
+
+            rate = measure_rate(run, n)
+            print(f"{engine.__name__:<16} max_size={max_size:<7} {rate:12,.0f} ops/s  hit rate {hits / n:.1%}")
+
+
+class RecursiveAVLTree:
+    """
+    The original AVLTree insert: a recursive closure and `__dict__` nodes.
+    Its remove picked rotation cases by key and broke on deletions, so it isn't timed.
+    """
+
+    class Node:
+        def __init__(self, val):
+            self.left = None
+            self.right = None
+            self.val = val
+            self.h = 1
+
+    def __init__(self):
+        self.root = None
+
+    @staticmethod
+    def _height(node):
+        return node.h if node else 0
+
+    def _rotate_left(self, a):
+        b = a.right
+        a.right = b.left
+        b.left = a
+        a.h = 1 + max(self._height(a.left), self._height(a.right))
+        b.h = 1 + max(self._height(b.left), self._height(b.right))
+        return b
+
+    def _rotate_right(self, a):
+        b = a.left
+        a.left = b.right
+        b.right = a
+        a.h = 1 + max(self._height(a.left), self._height(a.right))
+        b.h = 1 + max(self._height(b.left), self._height(b.right))
+        return b
+
+    def _rebalance_node(self, node, val):
+        node.h = 1 + max(self._height(node.left), self._height(node.right))
+        balance = self._height(node.left) - self._height(node.right)
+        if balance < -1 and val > node.right.val:
+            return self._rotate_left(node)
+        if balance > 1 and val < node.left.val:
+            return self._rotate_right(node)
+        if balance < -1 and val < node.right.val:
+            node.right = self._rotate_right(node.right)
+            return self._rotate_left(node)
+        if balance > 1 and val > node.left.val:
+            node.left = self._rotate_left(node.left)
+            return self._rotate_right(node)
+        return node
+
+    def insert(self, val):
+        def _insert_dfs(node, val):
+            if node is None:
+                return self.Node(val)
+            if val < node.val:
+                node.left = _insert_dfs(node.left, val)
+            elif val > node.val:
+                node.right = _insert_dfs(node.right, val)
+            else:
+                return node
+            return self._rebalance_node(node, val)
+
+        self.root = _insert_dfs(self.root, val)
+        return True
+
+
+def bench_avl_tree(n):
+    random_keys = list(range(n))
+    random.shuffle(random_keys)
+
+    for order, keys in (("sequential", list(range(n))), ("random", random_keys)):
+        for engine in (RecursiveAVLTree, AVLTree):
+            tree = engine()
+            inserts = measure_rate(lambda: [tree.insert(key) for key in keys], n)
+            line = f"{engine.__name__:<18} {order:<10} {inserts:12,.0f} inserts/s"
+            if hasattr(tree, "remove"):
+                removes = measure_rate(lambda: [tree.remove(key) for key in keys], n)
+                line += f" {removes:12,.0f} removes/s"
+            print(line)
+
+    keys = list(range(n))
+    tree = AVLTree()
+    inserts = measure_rate(lambda: [tree.insert(key) for key in keys], n)
+    bulk = measure_rate(lambda: AVLTree.from_sorted(keys), n)
+    print(f"{'AVLTree.from_sorted':<29} {bulk:12,.0f} keys/s  x{bulk / inserts:.1f} vs insert")
+
+
+def bench_priority_queue(n):
+    items = [random.random() for _ in range(n)]
+
+    def run_heapq():
+        heap = []
+        for item in items:
+            heapq.heappush(heap, item)
+        for _ in items:
+            heapq.heappop(heap)
+
+    print(f"{'heapq':<22} {measure_rate(run_heapq, 2 * n):12,.0f} push+pop/s")
+
+    for arity in (2, 4):
+        def run_heap():
+            heap = MinHeap(arity=arity)
+            for item in items:
+                heap.push(item)
+            for _ in items:
+                heap.pop()
+
+        print(f"{f'MinHeap arity={arity}':<22} {measure_rate(run_heap, 2 * n):12,.0f} push+pop/s")
+
+    def run_queue():
+        queue = PriorityQueue()
+        for item in items:
+            queue.push(item, item)
+        for _ in items:
+            queue.pop()
+
+    print(f"{'PriorityQueue':<22} {measure_rate(run_queue, 2 * n):12,.0f} push+pop/s")
+
+    rate = measure_rate(lambda: heapq.heapify(list(items)), n)
+    print(f"{'heapq.heapify':<22} {rate:12,.0f} items/s")
+    rate = measure_rate(lambda: MinHeap().push_many(items), n)
+    print(f"{'MinHeap.push_many':<22} {rate:12,.0f} items/s")
+
+
+class DequeQueue:
+    def __init__(self):
+        self._buffer = collections.deque()
+
+    def put(self, val):
+        self._buffer.append(val)
+
+    def get(self):
+        return self._buffer.popleft() if self._buffer else None
+
+
+def bench_queue(n):
+    items = list(range(n))
+
+    for engine in (LinkedQueue, Queue, DequeQueue):
+        queue = engine()
+
+        def fill_drain():
+            for item in items:
+                queue.put(item)
+            for _ in items:
+                queue.get()
+
+        def steady():
+            # short queue, the common producer/consumer case
+            for item in items:
+                queue.put(item)
+                queue.put(item)
+                queue.get()
+                queue.get()
+
+        print(f"{engine.__name__:<12} {measure_rate(fill_drain, 2 * n):12,.0f} ops/s fill/drain"
+              f" {measure_rate(steady, 4 * n):12,.0f} ops/s steady")
+
+    queue = Queue()
+    rate = measure_rate(lambda: [queue.put_many(items[i:i + 1000]) for i in range(0, n, 1000)]
+                        + [queue.get_many(1000) for _ in range(0, n, 1000)], 2 * n)
+    print(f"{'Queue batch':<12} {rate:12,.0f} ops/s put_many/get_many of 1000")
+
+
+def bench_linked_list(n):
+    items = list(range(n))
+    # LinkedList.pop() walks the whole list, keep its share quadratic but bounded
+    pops = min(n, 2000)
+
+    for engine in (LinkedList, DoublyLinkedList, UnrolledLinkedList):
+        def build():
+            linked_list = engine()
+            for item in items:
+                linked_list.put(item)
+            return linked_list
+
+        per_item = measure_memory(build) / n
+        linked_list = engine()
+        appends = measure_rate(lambda: [linked_list.put(item) for item in items], n)
+        tail_pops = measure_rate(lambda: [linked_list.pop() for _ in range(pops)], pops)
+        middle = len(linked_list) * 3 // 4
+        gets = measure_rate(lambda: [linked_list.get(middle) for _ in range(100)], 100)
+        print(f"{engine.__name__:<18} {appends:12,.0f} appends/s {tail_pops:12,.0f} tail pops/s"
+              f" {gets:10,.0f} gets/s at 3/4 {per_item:8.1f} bytes/item")
+
+    linked_list = build()
+    positions = [random.randrange(n) for _ in range(n)]
+    gets = measure_rate(lambda: [linked_list.get(i) for i in positions], n)
+    inserts = measure_rate(lambda: [linked_list.put(-1, i) for i in positions[:pops]], pops)
+    print(f"{'UnrolledLinkedList':<18} {gets:12,.0f} random gets/s {inserts:12,.0f} random inserts/s")
+
+
+def bench_array_list(n):
+    floats = [random.random() for _ in range(n)]
+    source = array("d", floats)
+
+    for typecode in (None, "d"):
+        def build(values):
+            array_list = ArrayList(typecode)
+            for value in values:
+                array_list.append(value)
+            return array_list
+
+        # fresh floats, so the boxed list is charged for the objects it keeps alive
+        per_item = measure_memory(lambda: build(value + 1.0 for value in floats)) / n
+        appends = measure_rate(lambda: build(floats), n)
+        extends = measure_rate(lambda: ArrayList(typecode).extend(source), n)
+        label = f"ArrayList({typecode!r})"
+        print(f"{label:<16} {appends:12,.0f} appends/s {extends:14,.0f} extend items/s"
+              f" {per_item:6.1f} bytes/item")
+
+    # the same work through the per-element API and as bulk slice copies
+    array_list = ArrayList("d")
+    array_list.extend(source)
+    half = n // 2
+    lines = [
+        ("append loop", lambda: [array_list.append(value) for value in floats[:half]],
+         "extend", lambda: array_list.extend(floats[:half])),
+        ("get loop", lambda: [array_list.get(i) for i in range(half)],
+         "slice read", lambda: array_list[:half]),
+        ("set loop", lambda: [array_list.set(i, floats[i]) for i in range(half)],
+         "slice write", lambda: array_list.__setitem__(slice(0, half), source[:half])),
+        ("pop loop", lambda: [array_list.pop() for _ in range(half)],
+         "slice delete", lambda: array_list.__setitem__(slice(len(array_list) - half, None), ())),
+    ]
+    for scalar_name, scalar, bulk_name, bulk in lines:
+        scalar_rate = measure_rate(scalar, half)
+        bulk_rate = measure_rate(bulk, half)
+        print(f"{scalar_name:<12} {scalar_rate:14,.0f} items/s {bulk_name:<12} {bulk_rate:14,.0f} items/s"
+              f" {bulk_rate / scalar_rate:6.1f}x")
+
+    inserts = min(n, 2000)
+    front = measure_rate(lambda: [array_list.insert(0, 0.5) for _ in range(inserts)], inserts)
+    array_list.sort()
+    searches = measure_rate(lambda: [array_list.bisect_left(value) for value in floats[:inserts]], inserts)
+    print(f"{'insert(0)':<12} {front:14,.0f} items/s {'bisect':<12} {searches:14,.0f} items/s")
+
+    views = measure_rate(lambda: [bytes(array_list.memoryview()[:1]) for _ in range(1000)], 1000)
+    label = "ArrayList('d')"
+    print(f"{label:<16} {views:12,.0f} memoryview exports/s of {n:,} items")
+
+
+def bench_mapped_array_list(n):
+    records = [(i, random.random()) for i in range(n)]
+    positions = [random.randrange(n) for _ in range(n)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "series.bin")
+        with MappedArrayList(path, "qd") as series:
+            appends = measure_rate(lambda: [series.append(record) for record in records], n)
+            extends = measure_rate(lambda: series.extend(records), n)
+            gets = measure_rate(lambda: [series.get(i) for i in positions], n)
+            sets = measure_rate(lambda: [series.set(i, records[i]) for i in positions], n)
+        print(f"MappedArrayList  {appends:12,.0f} appends/s {extends:12,.0f} extend items/s"
+              f" {gets:12,.0f} random gets/s {sets:12,.0f} random sets/s")
+
+        start = time.perf_counter()
+        opened = MappedArrayList(path, "qd", readonly=True)
+        first = opened.get(len(opened) - 1)
+        reopen = time.perf_counter() - start
+        opened.close()
+        assert first == records[-1]
+        print(f"MappedArrayList  reopen of {2 * n:,} records and first get in {reopen * 1000:.2f} ms")
+
+
+def bench_snapshot(n):
+    keys = list(range(n))
+    random.shuffle(keys)
+
+    hashmap = HashMap()
+    tree = AVLTree()
+    queue = PriorityQueue()
+    for key in keys:
+        hashmap.put(key, key)
+        tree.insert(key, key)
+        queue.push(key, key)
+
+    def rebuild_hashmap():
+        rebuilt = HashMap()
+        for key in keys:
+            rebuilt.put(key, key)
+
+    def rebuild_tree():
+        rebuilt = AVLTree()
+        for key in keys:
+            rebuilt.insert(key, key)
+
+    def rebuild_queue():
+        rebuilt = PriorityQueue()
+        for key in keys:
+            rebuilt.push(key, key)
+
+    for structure, rebuild in ((hashmap, rebuild_hashmap), (tree, rebuild_tree), (queue, rebuild_queue)):
+        name = type(structure).__name__
+        buffer = io.BytesIO()
+        structure.dump(buffer)
+        pickled = pickle.dumps(structure, pickle.HIGHEST_PROTOCOL)
+
+        def load():
+            buffer.seek(0)
+            type(structure).load(buffer)
+
+        timings = []
+        for fn in (rebuild, lambda: pickle.loads(pickled), load):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        rebuild_time, unpickle_time, load_time = timings
+        print(f"{name:<14} startup: rebuild {rebuild_time * 1000:8.1f} ms  unpickle {unpickle_time * 1000:8.1f} ms"
+              f"  load {load_time * 1000:8.1f} ms   snapshot {len(buffer.getvalue()) / n:5.1f} bytes/entry,"
+              f" pickle {len(pickled) / n:5.1f}")
+
+
+def bench_instrumentation(n):
+    keys = list(range(n))
+    random.shuffle(keys)
+
+    def run(structure, op):
+        return measure_rate(lambda: [op(structure, key) for key in keys], n)
+
+    for name, factory, op in (("HashMap.get", HashMap, HashMap.get), ("AVLTree.insert", AVLTree, AVLTree.insert),
+                              ("MinHeap.push", MinHeap, MinHeap.push)):
+        rates = []
+        for mode in ("plain", "enabled", "disabled"):
+            structure = factory()
+            if factory is HashMap:
+                for key in keys:
+                    structure.put(key, key)
+            if mode != "plain":
+                structure.enable_stats()
+            if mode == "disabled":
+                structure.disable_stats()
+            rates.append(run(structure, op))
+        plain, enabled, disabled = rates
+        print(f"{name:<16} plain {plain:12,.0f} ops/s  stats enabled {enabled:12,.0f} ops/s"
+              f"  enabled then disabled {disabled:12,.0f} ops/s")
+
+
+def _load_stdlib(name, relative_path):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(sysconfig.get_paths()["stdlib"], relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def stdlib_thread_pool():
+    """
+    Returns `concurrent.futures.ThreadPoolExecutor`. Its module uses the stdlib
+    `queue`, which the queue.py next to this file shadows, so load private
+    copies of both from the stdlib directory and point one at the other;
+    `sys.path` and `sys.modules` stay as they are.
+    """
+    thread = _load_stdlib("_stdlib_futures_thread", os.path.join("concurrent", "futures", "thread.py"))
+    # its `import queue` found the local module, swap in the stdlib one
+    thread.queue = _load_stdlib("_stdlib_queue", "queue.py")
+    return thread.ThreadPoolExecutor
+
+
+def bench_work_stealing(n):
+    ThreadPoolExecutor = stdlib_thread_pool()
+    # binary task trees of about n tiny tasks
+    depth = max(1, n.bit_length() - 1)
+    tasks = 2 ** (depth + 1) - 1
+
+    def fan_out(executor):
+        # every task submits its children and returns, nothing waits
+        done = threading.Event()
+        finished = itertools.count(1)
+
+        def node(level):
+            if level:
+                executor.submit(node, level - 1)
+                executor.submit(node, level - 1)
+            if next(finished) == tasks:
+                done.set()
+
+        executor.submit(node, depth)
+        done.wait()
+
+    # a thread pool needs a thread per waiting parent, keep these trees small
+    join_depth = min(depth, 8)
+    join_tasks = 2 ** (join_depth + 1) - 1
+
+    def fork_join(executor):
+        def node(level):
+            if not level:
+                return 1
+            left = executor.submit(node, level - 1)
+            right = executor.submit(node, level - 1)
+            return left.result() + right.result() + 1
+
+        assert executor.submit(node, join_depth).result() == join_tasks
+
+    for workers in (1, 4, 8):
+        for engine in (ThreadPoolExecutor, WorkStealingExecutor):
+            with engine(max_workers=workers) as executor:
+                rate = measure_rate(lambda: fan_out(executor), tasks)
+            print(f"{engine.__name__:<20} {workers} workers fan-out   {rate:12,.0f} tasks/s")
+
+        with WorkStealingExecutor(max_workers=workers) as executor:
+            rate = measure_rate(lambda: fork_join(executor), join_tasks)
+        print(f"{'WorkStealingExecutor':<20} {workers} workers fork/join {rate:12,.0f} tasks/s")
+
+    with ThreadPoolExecutor(max_workers=2 ** join_depth) as executor:
+        rate = measure_rate(lambda: fork_join(executor), join_tasks)
+    print(f"{'ThreadPoolExecutor':<20} {2 ** join_depth} workers fork/join {rate:12,.0f} tasks/s")
+
+
+BENCHMARKS = {
+    "array_list": bench_array_list,
+    "mapped_array_list": bench_mapped_array_list,
+    "hashmap": bench_hashmap,
+    "concurrent_hashmap": bench_concurrent_hashmap,
+    "sharded_hashmap": bench_sharded_hashmap,
+    "linked_hashmap": bench_linked_hashmap,
+    "avl_tree": bench_avl_tree,
+    "priority_queue": bench_priority_queue,
+    "queue": bench_queue,
+    "linked_list": bench_linked_list,
+    "snapshot": bench_snapshot,
+    "instrumentation": bench_instrumentation,
+    "treeify": bench_treeify,
+    "work_stealing": bench_work_stealing,
+}
+
+
+# Multiples of the stride collide in every HashMap table up to ten million
+# buckets (capacities are 10 * 2 ** k) and arrive in descending order, the worst
+# case for heaps and search trees. Each costs O(n) in a chained map, so cap them.
+ADVERSARIAL_STRIDE = 10 * 2 ** 20
+ADVERSARIAL_KEYS = 2_000
+
+# read fraction of each workload; "write" starts empty, the others prefilled
+SUITE_WORKLOADS = {"write": 0.0, "read": 1.0, "mix90": 0.9, "mix50": 0.5}
+
+# `close(structure)`, if set, releases what `factory()` acquired
+SuiteTarget = collections.namedtuple("SuiteTarget", "factory write read thread_safe max_n close", defaults=(None,))
+
+
+def suite_keys(n):
+    return {
+        "sequential": list(range(n)),
+        "random": random.sample(range(n), n),
+        "zipf": zipf_keys(n, n),
+        "adversarial": [i * ADVERSARIAL_STRIDE for i in range(min(n, ADVERSARIAL_KEYS), 0, -1)],
+    }
+
+
+def _put_pair(structure, key):
+    structure.put(key, key)
+
+
+def _get_key(structure, key):
+    return structure.get(key)
+
+
+def _get_at(structure, key):
+    return structure.get(key % len(structure))
+
+
+def _pop_any(structure, key):
+    return structure.pop() if len(structure) else None
+
+
+def _steal_any(deque, key):
+    try:
+        return deque.steal()
+    except IndexError:
+        return None
+
+
+def _mapped_array_list():
+    return MappedArrayList(os.path.join(tempfile.mkdtemp(), "suite.bin"), "q")
+
+
+def _close_mapped_array_list(records):
+    records.close()
+    shutil.rmtree(os.path.dirname(records._file.name))
+
+
+def _get_nowait(structure, key):
+    try:
+        return structure.get_nowait()
+    except Empty:
+        return None
+
+
+SUITE_TARGETS = {
+    "ArrayList": SuiteTarget(ArrayList, ArrayList.append, _get_at, False, None),
+    "ArrayList('q')": SuiteTarget(lambda: ArrayList("q"), ArrayList.append, _get_at, False, None),
+    "MappedArrayList('q')": SuiteTarget(_mapped_array_list, MappedArrayList.append, _get_at, False, None,
+                                        _close_mapped_array_list),
+    # positional reads walk the list
+    "LinkedList": SuiteTarget(LinkedList, LinkedList.put, _get_at, False, 2_000),
+    "DoublyLinkedList": SuiteTarget(DoublyLinkedList, DoublyLinkedList.put, _get_at, False, 2_000),
+    "UnrolledLinkedList": SuiteTarget(UnrolledLinkedList, UnrolledLinkedList.put, _get_at, False, None),
+    "HashMap": SuiteTarget(HashMap, _put_pair, _get_key, False, None),
+    "CompactHashMap": SuiteTarget(CompactHashMap, _put_pair, _get_key, False, None),
+    "LinkedHashMap": SuiteTarget(LinkedHashMap, _put_pair, _get_key, False, None),
+    "ConcurrentHashMap": SuiteTarget(ConcurrentHashMap, _put_pair, _get_key, True, None),
+    # every op is a pipe round trip to a worker process
+    "ShardedHashMap": SuiteTarget(lambda: ShardedHashMap(shards=2), _put_pair, _get_key, False, 2_000,
+                                  ShardedHashMap.close),
+    "AVLTree": SuiteTarget(AVLTree, lambda tree, key: tree.insert(key, key), AVLTree.__getitem__, False, None),
+    "Stack": SuiteTarget(Stack, Stack.push, _pop_any, False, None),
+    "WorkStealingDeque": SuiteTarget(WorkStealingDeque, WorkStealingDeque.push, _steal_any, True, None),
+    "Queue": SuiteTarget(Queue, Queue.put, lambda queue, key: queue.get(), False, None),
+    "LinkedQueue": SuiteTarget(LinkedQueue, LinkedQueue.put, lambda queue, key: queue.get(), False, None),
+    "BlockingQueue": SuiteTarget(BlockingQueue, BlockingQueue.put, _get_nowait, True, None),
+    "PriorityQueue": SuiteTarget(PriorityQueue, lambda queue, key: queue.push(key, key), _pop_any, False, None),
+    "IndexedPriorityQueue": SuiteTarget(IndexedPriorityQueue, lambda queue, key: queue.push(key, key), _pop_any,
+                                        False, None),
+}
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_workload(target, keys, read_fraction, threads):
+    """
+    Runs one op per key, split over `threads` threads, and returns
+    `(ops/sec, sorted per-op latencies in ns)`.
+    """
+    structure = target.factory()
+    if read_fraction:
+        for key in keys:
+            target.write(structure, key)
+
+    rng = random.Random(len(keys))
+    plan = [rng.random() < read_fraction for _ in keys]
+    latencies = [[] for _ in range(threads)]
+    share = -(-len(keys) // threads)
+
+    def worker(i):
+        write, read, clock = target.write, target.read, time.perf_counter_ns
+        timings = latencies[i]
+        for key, is_read in zip(keys[i * share:(i + 1) * share], plan[i * share:(i + 1) * share]):
+            start = clock()
+            if is_read:
+                read(structure, key)
+            else:
+                write(structure, key)
+            timings.append(clock() - start)
+
+    rate = measure_threaded_rate(worker, threads, share) if threads > 1 else measure_rate(lambda: worker(0), len(keys))
+    if target.close:
+        target.close(structure)
+    return rate, sorted(itertools.chain.from_iterable(latencies))
+
+
+def peak_memory(target, keys):
+    """
+    Returns the tracemalloc peak of filling a fresh structure with `keys`.
+    """
+    tracemalloc.start()
+    try:
+        structure = target.factory()
+        for key in keys:
+            target.write(structure, key)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if target.close:
+        target.close(structure)
+    return peak
+
+
+def run_suite(n, targets, max_threads, repeat=1):
+    """
+    Returns `{"target|workload|keys|threads": metrics}`; memory is keyed `target|memory`.
+    Every metric is the median of `repeat` runs, a single run's tail latency is mostly noise.
+    """
+    key_sets = suite_keys(n)
+    thread_counts = [1]
+    while thread_counts[-1] * 2 <= max_threads:
+        thread_counts.append(thread_counts[-1] * 2)
+
+    results = {}
+    for name in targets:
+        target = SUITE_TARGETS[name]
+        for key_name, keys in key_sets.items():
+            keys = keys[:target.max_n]
+            for workload, read_fraction in SUITE_WORKLOADS.items():
+                for threads in thread_counts if target.thread_safe else [1]:
+                    runs = []
+                    for _ in range(repeat):
+                        rate, latencies = run_workload(target, keys, read_fraction, threads)
+                        runs.append({
+                            "ops_per_sec": rate,
+                            "p50_us": percentile(latencies, 0.5) / 1000,
+                            "p99_us": percentile(latencies, 0.99) / 1000,
+                            "p999_us": percentile(latencies, 0.999) / 1000,
+                        })
+                    metrics = {metric: statistics.median(run[metric] for run in runs) for metric in runs[0]}
+                    results[f"{name}|{workload}|{key_name}|{threads}"] = metrics
+                    rate = metrics["ops_per_sec"]
+                    print(f"{name:<18} {workload:<6} {key_name:<12} {threads:>2}t {rate:12,.0f} ops/s"
+                          f"  p50 {metrics['p50_us']:8.2f}  p99 {metrics['p99_us']:8.2f}"
+                          f"  p999 {metrics['p999_us']:8.2f} us")
+
+        keys = key_sets["random"][:target.max_n]
+        peak = peak_memory(target, keys)
+        results[f"{name}|memory"] = {"peak_bytes": peak, "bytes_per_item": peak / len(keys)}
+        print(f"{name:<18} peak memory {peak:12,} bytes  {peak / len(keys):8.1f} bytes/item")
+    return results
+
+
+# metric -> True if higher is better
+SUITE_METRICS = {"ops_per_sec": True, "p99_us": False, "bytes_per_item": False}
+# checked against `latency_tolerance`: tails of microsecond ops swing with the
+# scheduler, and only on one thread, with more the tail is GIL switch intervals
+LATENCY_METRICS = {"p99_us"}
+
+
+def compare_to_baseline(results, baseline, tolerance, latency_tolerance):
+    """
+    Prints every metric that got worse than `baseline` by more than `tolerance`
+    (a fraction), `latency_tolerance` for latencies, and returns how many did.
+    """
+    regressions = 0
+    for key, metrics in results.items():
+        for metric, higher_is_better in SUITE_METRICS.items():
+            old = baseline.get(key, {}).get(metric)
+            new = metrics.get(metric)
+            if not old or new is None or (metric in LATENCY_METRICS and not key.endswith("|1")):
+                continue
+            ratio = new / old
+            allowed = latency_tolerance if metric in LATENCY_METRICS else tolerance
+            if (ratio < 1 - allowed) if higher_is_better else (ratio > 1 + allowed):
+                regressions += 1
+                print(f"REGRESSION {key} {metric}: {old:,.2f} -> {new:,.2f} ({ratio:.2f}x)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the data structures.")
+    parser.add_argument("names", nargs="*", metavar="name",
+                        help="benchmarks: " + ", ".join(BENCHMARKS) + "; with --suite, targets: " + ", ".join(SUITE_TARGETS))
+    parser.add_argument("-n", type=int, help="number of elements (default 200000, 20000 with --suite)")
+    parser.add_argument("--suite", action="store_true", help="run the standard workloads against every target")
+    parser.add_argument("--threads", type=int, default=4, help="max threads for thread-safe targets")
+    parser.add_argument("--json", metavar="PATH", help="save suite results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="compare suite results with a saved JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed relative regression of throughput and memory")
+    parser.add_argument("--latency-tolerance", type=float, default=1.0, help="allowed relative regression of single-threaded p99")
+    parser.add_argument("--repeat", type=int, default=3, help="suite runs per workload, metrics are the median")
+    args = parser.parse_args()
+    choices = SUITE_TARGETS if args.suite else BENCHMARKS
+    for name in args.names:
+        if name not in choices:
+            parser.error(f"unknown {'target' if args.suite else 'benchmark'} {name!r}")
+    if (args.json or args.baseline) and not args.suite:
+        parser.error("--json and --baseline need --suite")
+
+    if not args.suite:
+        for name in args.names or BENCHMARKS:
+            print(f"== {name}")
+            BENCHMARKS[name](args.n or 200_000)
+    else:
+        n = args.n or 20_000
+        results = run_suite(n, args.names or list(SUITE_TARGETS), args.threads, args.repeat)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"n": n, "repeat": args.repeat, "python": platform.python_version(), "results": results},
+                          f, indent=1)
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            if baseline.get("n") != n:
+                print(f"warning: baseline ran with n={baseline.get('n')}, this run with n={n}")
+            regressions = compare_to_baseline(results, baseline["results"], args.tolerance, args.latency_tolerance)
+            print(f"{regressions} regression(s) against {args.baseline}")
+            if regressions:
+                raise SystemExit(1)
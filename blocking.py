@@ -0,0 +1,142 @@
+import asyncio
+import threading
+
+
+class Empty(Exception):
+    """Raised by a non-blocking or timed out get on an empty buffer."""
+
+
+class Full(Exception):
+    """Raised by a non-blocking or timed out put on a full buffer."""
+
+
+class BlockingBuffer:
+    def __init__(self, maxsize=0):
+        """
+        Thread-safe producer/consumer wrapper around a single-threaded buffer.
+
+        Subclasses set `self._buffer` and implement `_put(*args)` and `_get()`.
+        With `maxsize > 0`, `put` blocks while the buffer is full, which gives
+        producers backpressure. Waiters sleep on conditions sharing one lock,
+        and `get_many` drains a whole batch per wakeup.
+        """
+        self.maxsize = maxsize
+        self._mutex = threading.Lock()
+        self._not_empty = threading.Condition(self._mutex)
+        self._not_full = threading.Condition(self._mutex)
+
+    def _full(self):
+        return 0 < self.maxsize <= len(self._buffer)
+
+    @staticmethod
+    def _wait(condition, predicate, block, timeout):
+        # the condition's lock is held
+        if not block:
+            return predicate()
+        return condition.wait_for(predicate, timeout)
+
+    def put(self, *args, block=True, timeout=None):
+        """
+        Puts an item, waiting up to `timeout` seconds (forever if None) for a
+        free slot; raises Full if there is none.
+        """
+        with self._not_full:
+            if not self._wait(self._not_full, lambda: not self._full(), block, timeout):
+                raise Full
+            self._put(*args)
+            self._not_empty.notify()
+
+    def get(self, block=True, timeout=None):
+        """
+        Gets an item, waiting up to `timeout` seconds (forever if None) for
+        one; raises Empty if there is none.
+        """
+        with self._not_empty:
+            if not self._wait(self._not_empty, lambda: len(self._buffer) > 0, block, timeout):
+                raise Empty
+            item = self._get()
+            self._not_full.notify()
+            return item
+
+    def get_many(self, max_items, timeout=None):
+        """
+        Waits up to `timeout` seconds for at least one item, then takes up to
+        `max_items` without waiting again. Returns an empty list on timeout.
+        """
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: len(self._buffer) > 0, timeout):
+                return []
+            items = [self._get() for _ in range(min(max_items, len(self._buffer)))]
+            self._not_full.notify(len(items))
+            return items
+
+    def put_nowait(self, *args):
+        return self.put(*args, block=False)
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def __len__(self):
+        with self._mutex:
+            return len(self._buffer)
+
+
+class AsyncBuffer:
+    def __init__(self, maxsize=0):
+        """
+        asyncio counterpart of `BlockingBuffer` for use inside one event loop.
+        Waiters are futures parked on `asyncio.Condition`s, no thread is spent
+        per waiter. Not thread-safe.
+        """
+        self.maxsize = maxsize
+        self._lock = asyncio.Lock()
+        self._not_empty = asyncio.Condition(self._lock)
+        self._not_full = asyncio.Condition(self._lock)
+
+    def _full(self):
+        return 0 < self.maxsize <= len(self._buffer)
+
+    async def put(self, *args, timeout=None):
+        """
+        Puts an item, waiting up to `timeout` seconds (forever if None) for a
+        free slot; raises Full if there is none.
+        """
+        async with self._not_full:
+            try:
+                await asyncio.wait_for(self._not_full.wait_for(lambda: not self._full()), timeout)
+            except asyncio.TimeoutError:
+                raise Full from None
+            self._put(*args)
+            self._not_empty.notify()
+
+    async def get(self, timeout=None):
+        """
+        Gets an item, waiting up to `timeout` seconds (forever if None) for
+        one; raises Empty if there is none.
+        """
+        async with self._not_empty:
+            try:
+                await asyncio.wait_for(self._not_empty.wait_for(lambda: len(self._buffer) > 0), timeout)
+            except asyncio.TimeoutError:
+                raise Empty from None
+            item = self._get()
+            self._not_full.notify()
+            return item
+
+    async def get_many(self, max_items, timeout=None):
+        """
+        Waits up to `timeout` seconds for at least one item, then takes up to
+        `max_items` without waiting again. Returns an empty list on timeout.
+        """
+        async with self._not_empty:
+            try:
+                await asyncio.wait_for(self._not_empty.wait_for(lambda: len(self._buffer) > 0), timeout)
+            except asyncio.TimeoutError:
+                return []
+            items = [self._get() for _ in range(min(max_items, len(self._buffer)))]
+            self._not_full.notify(len(items))
+            return items
+
+    def __len__(self):
+        return len(self._buffer)
+
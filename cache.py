@@ -0,0 +1,325 @@
+import collections
+import functools
+import sys
+import threading
+import time
+
+from linked_hashmap import LinkedHashMap
+
+CacheInfo = collections.namedtuple("CacheInfo", "hits misses evictions expirations size bytes")
+
+# returned by `get` for a missing or expired key, cached values may be None
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, max_size=128, max_bytes=None, ttl=None, sizeof=sys.getsizeof):
+        """
+        Bounded LRU cache on top of an access-ordered `LinkedHashMap`.
+
+        Entries are evicted least recently used first once there are more than
+        `max_size` of them or their approximate size (`sizeof(value)`, shallow
+        by default) exceeds `max_bytes`. With `ttl` (seconds) an entry expires
+        that long after it was stored; expired entries are dropped on access.
+        Not thread-safe, see `ConcurrentLRUCache`.
+        """
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bytes = 0
+        # values are `(value, expires_at, nbytes)` entries
+        self._map = LinkedHashMap(access_order=True, max_size=max_size, on_evict=self._on_evict)
+
+    def _on_evict(self, key, entry):
+        self.evictions += 1
+        self.bytes -= entry[2]
+
+    def get(self, key):
+        """
+        Returns the cached value or `MISSING`; O(1) average.
+        """
+        entry = self._map.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        value, expires_at, nbytes = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._map.remove(key)
+            self.bytes -= nbytes
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Stores the value, evicting least recently used entries past the budget; O(1) amortized.
+        """
+        old = self._map.remove(key)
+        if old is not None:
+            self.bytes -= old[2]
+
+        nbytes = self.sizeof(value) if self.max_bytes is not None else 0
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.bytes += nbytes
+        self._map.put(key, (value, expires_at, nbytes))
+
+        if self.max_bytes is not None:
+            while self.bytes > self.max_bytes and self._map.evict():
+                pass
+        return True
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value, calling `compute()` and storing its result on a miss.
+        """
+        value = self.get(key)
+        if value is MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.expirations, len(self._map), self.bytes)
+
+    def clear(self):
+        """
+        Drops every entry and resets the counters, like `functools.lru_cache`'s `cache_clear`.
+        """
+        self._map = LinkedHashMap(access_order=True, max_size=self.max_size, on_evict=self._on_evict)
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._map)
+
+
+class _Call:
+    """
+    An in-flight computation that other callers of the same key wait for.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class ConcurrentLRUCache:
+    def __init__(self, max_size=128, max_bytes=None, ttl=None, sizeof=sys.getsizeof, concurrency=16):
+        """
+        Thread-safe LRU cache striped like `ConcurrentHashMap`: keys go to one
+        of `concurrency` segments by `hash(key) % concurrency`, each an
+        `LRUCache` with its own lock and an even share of the budget, so the
+        recency order is kept per segment. The shares add up to the budget:
+        there are no more segments than `max_size` or `max_bytes`.
+
+        `get_or_compute` is single-flight: concurrent callers missing the same
+        key wait for one computation instead of all running it.
+        """
+        budgets = [budget for budget in (max_size, max_bytes) if budget is not None]
+        concurrency = max(1, int(min([concurrency] + budgets)))
+
+        def share(budget, i):
+            return None if budget is None else budget // concurrency + (1 if i < budget % concurrency else 0)
+
+        self.locks = [threading.Lock() for _ in range(concurrency)]
+        self.segments = [LRUCache(share(max_size, i), share(max_bytes, i), ttl, sizeof) for i in range(concurrency)]
+        self._calls = [{} for _ in range(concurrency)]
+
+    def _stripe(self, key):
+        return hash(key) % len(self.locks)
+
+    def get(self, key):
+        stripe = self._stripe(key)
+        with self.locks[stripe]:
+            return self.segments[stripe].get(key)
+
+    def put(self, key, value):
+        stripe = self._stripe(key)
+        with self.locks[stripe]:
+            return self.segments[stripe].put(key, value)
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value. On a miss the first caller runs `compute()`
+        without holding the lock and the others wait for its result or error.
+        """
+        stripe = self._stripe(key)
+        lock, segment, calls = self.locks[stripe], self.segments[stripe], self._calls[stripe]
+
+        with lock:
+            value = segment.get(key)
+            if value is not MISSING:
+                return value
+            call = calls.get(key)
+            leader = call is None
+            if leader:
+                call = calls[key] = _Call()
+
+        if not leader:
+            return call.wait()
+
+        try:
+            call.value = compute()
+        except BaseException as e:
+            call.error = e
+            raise
+        else:
+            with lock:
+                segment.put(key, call.value)
+            return call.value
+        finally:
+            with lock:
+                del calls[key]
+            call.done.set()
+
+    def info(self):
+        return CacheInfo(*(sum(field) for field in zip(*(segment.info() for segment in self.segments))))
+
+    def clear(self):
+        for lock, segment in zip(self.locks, self.segments):
+            with lock:
+                segment.clear()
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+
+def _make_key(args, kwargs):
+    if kwargs:
+        return args + (MISSING,) + tuple(sorted(kwargs.items()))
+    # like functools.lru_cache: a lone int or str can't be mistaken for an args tuple
+    if len(args) == 1 and type(args[0]) in (int, str):
+        return args[0]
+    return args
+
+
+def cached(fn=None, *, max_size=128, max_bytes=None, ttl=None, sizeof=sys.getsizeof, thread_safe=False):
+    """
+    Memoizes a function in an `LRUCache`, or a single-flight
+    `ConcurrentLRUCache` with `thread_safe=True`. Arguments must be hashable.
+    The cache is exposed as `fn.cache`, its counters as `fn.cache_info()`.
+
+        @cached(max_size=1024, ttl=60)
+        def load(user_id): ...
+    """
+    def decorator(fn):
+        if thread_safe:
+            cache = ConcurrentLRUCache(max_size, max_bytes, ttl, sizeof)
+        else:
+            cache = LRUCache(max_size, max_bytes, ttl, sizeof)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return cache.get_or_compute(_make_key(args, kwargs), lambda: fn(*args, **kwargs))
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.info
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator(fn) if fn is not None else decorator
+
+
+if __name__ == "__main__":
+    calls = []
+
+    @cached
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert square(3) == 9 and square(3) == 9
+    assert calls == [3]
+    assert square.cache_info().hits == 1
+
+    @cached(max_size=2)
+    def ident(x, scale=1):
+        calls.append(x)
+        return None if x == "none" else x * scale
+
+    calls.clear()
+    ident(1), ident(2), ident(1), ident(3), ident(2)
+    assert calls == [1, 2, 3, 2]
+    assert ident(3, scale=2) == 6 and ident.cache_info().evictions == 3
+    assert ident("none") is None and ident("none") is None and calls.count("none") == 1
+
+    @cached(max_size=None, max_bytes=3 * sys.getsizeof(b"x" * 100))
+    def blob(n):
+        return b"x" * n
+
+    for i in range(10):
+        blob(100 + i % 2)
+        blob(200 + i)
+    assert blob.cache.bytes <= blob.cache.max_bytes and blob.cache_info().evictions > 0
+
+    @cached(ttl=0.05)
+    def now(_):
+        return time.monotonic()
+
+    first = now("a")
+    assert now("a") == first
+    time.sleep(0.06)
+    assert now("a") != first and now.cache_info().expirations == 1
+
+    calls.clear()
+
+    @cached(thread_safe=True)
+    def slow(x):
+        calls.append(x)
+        time.sleep(0.05)
+        return x
+
+    threads = [threading.Thread(target=slow, args=(7,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [7] and slow(7) == 7
+
+    @cached(thread_safe=True)
+    def fails(x):
+        raise KeyError(x)
+
+    try:
+        fails(1)
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("error not propagated")
+    assert len(fails.cache) == 0
+
+    # the segments' shares add up to the budget
+    @cached(max_size=2, thread_safe=True)
+    def pair(x):
+        return x
+
+    for i in range(100):
+        pair(i)
+    assert len(pair.cache) == 2 and len(pair.cache.segments) == 2
+    cache = ConcurrentLRUCache(max_size=100, concurrency=16)
+    assert sum(segment.max_size for segment in cache.segments) == 100
+    for i in range(1000):
+        cache.put(i, i)
+    assert len(cache) <= 100
+
+    pair.cache_clear()
+    assert pair.cache_info() == (0, 0, 0, 0, 0, 0)
+
+    print("OK!")
@@ -1,16 +1,177 @@
+import contextlib
+import itertools
+import operator
 import threading
-from hashmap import HashMap
+import instrumentation
+import snapshot
+from hashmap import HashMap, HashNode, _HashMapStats
+
+# Marks an old-table bucket whose nodes were already copied into the new table
+_MOVED = object()
+
 
 class ConcurrentHashMap(HashMap):
-    def __init__(self, capacity=10):
+    # lock-free readers and the copying migration walk plain chains
+    TREEIFY_THRESHOLD = float("inf")
+
+    def __init__(self, capacity=16, load_factor=0.75, concurrency=16):
+        """
+        Initializes the hashmap with an array of buckets (linked lists).
+
+        Writes take one of `concurrency` lock stripes. The capacity is kept a
+        multiple of the stripe count and only grows and shrinks by factors of
+        two, so a key's stripe (`hash(key) % concurrency`) covers its bucket in
+        every table and a resize can move buckets one stripe at a time while
+        other threads keep reading and writing.
+
+        Reads take no lock: the migration copies nodes and leaves a `_MOVED`
+        marker behind instead of relinking, so a chain a reader is walking is
+        never cut. The size is kept in per-stripe counters.
+        """
+        self.locks = [threading.RLock() for _ in range(concurrency)]
+        self._resize_lock = threading.Lock()
+        capacity = -(-capacity // concurrency) * concurrency
+        super().__init__(capacity=capacity, load_factor=load_factor)
+        self._moved = 0
+
+    @property
+    def size(self):
+        return sum(self._counts)
+
+    @size.setter
+    def size(self, value):
+        # only HashMap.__init__ assigns it, for the empty table
+        self._counts = [value] + [0] * (len(self.locks) - 1)
+
+    def _stripe(self, key):
+        return hash(key) % len(self.locks)
+
+    def _tables(self):
         """
-        Initializes the hashmap with a fixed-size array of buckets (linked lists).
+        Returns a consistent `(buckets, old_buckets)` pair without locking.
+        A resize publishes `_old_buckets` before swapping `buckets`.
+        """
+        while True:
+            old_buckets = self._old_buckets
+            buckets = self.buckets
+            if self._old_buckets is old_buckets:
+                return buckets, old_buckets
+
+    def _locate(self, key):
+        # the key's stripe is held, so its bucket can't be moved meanwhile
+        h = hash(key)
+        buckets, old_buckets = self._tables()
+        if old_buckets is not None:
+            index = h % len(old_buckets)
+            if old_buckets[index] is not _MOVED:
+                return old_buckets, index
+        return buckets, h % len(buckets)
 
-        Use lock for each bucket
+    def _chain(self, key):
+        """
+        Returns the first node of the chain `key` belongs to, without locking.
         """
+        h = hash(key)
+        node = _MOVED
+        while node is _MOVED:
+            # a resize starting after `_tables()` may move the bucket before
+            # it is read, even one of `buckets`: read the tables again
+            buckets, old_buckets = self._tables()
+            if old_buckets is not None:
+                node = old_buckets[h % len(old_buckets)]
+            if node is _MOVED:
+                node = buckets[h % len(buckets)]
+        return node
+
+    def _get(self, key):
+        node = self._chain(key)
+        while node:
+            if node.key == key:
+                return node.val
+            node = node.next
+
+        return None
+
+    def _maintain(self):
+        if self._old_buckets is not None:
+            self._rehash_step()
+            return
 
-        super().__init__(capacity=capacity)
-        self.locks = [threading.RLock() for _ in range(self.capacity)]
+        size = self.size
+        if self._shrink_at <= size <= self._grow_at:
+            return
+
+        with self._resize_lock:
+            if self._old_buckets is not None:
+                return
+            if size > self._grow_at:
+                self._start_resize(self.capacity * 2)
+            elif size < self._shrink_at:
+                self._start_resize(self.capacity // 2)
+
+    def _start_resize(self, new_capacity):
+        # called with `_resize_lock` held; writers caught in the old table keep
+        # writing there, their buckets are moved once they release the stripe
+        self._rehash_idx = 0
+        self._moved = 0
+        self._old_buckets = self.buckets
+        self.buckets = [None] * new_capacity
+        self.capacity = new_capacity
+        self._set_thresholds()
+
+    def _rehash_step(self):
+        """
+        Claims the next `REHASH_STEP` old buckets and copies each of them under
+        its stripe lock; the last step to finish retires the old table.
+        """
+        with self._resize_lock:
+            old_buckets = self._old_buckets
+            if old_buckets is None or self._rehash_idx >= len(old_buckets):
+                return
+            start = self._rehash_idx
+            end = min(start + self.REHASH_STEP, len(old_buckets))
+            self._rehash_idx = end
+
+        buckets = self.buckets
+        n = len(self.locks)
+        for i in range(start, end):
+            with self.locks[i % n]:
+                node = old_buckets[i]
+                while node:
+                    index = hash(node.key) % len(buckets)
+                    buckets[index] = HashNode(node.key, node.val, buckets[index])
+                    node = node.next
+                old_buckets[i] = _MOVED
+
+        with self._resize_lock:
+            self._moved += end - start
+            if self._moved == len(old_buckets) and self._old_buckets is old_buckets:
+                self._old_buckets = None
+
+    def _reserve(self, n):
+        """
+        Grows the table ahead of a batch that may take it to `n` entries and
+        finishes the migration, so the batch doesn't pile up in short chains.
+        """
+        while self._old_buckets is not None:
+            self._rehash_step()
+
+        with self._resize_lock:
+            if self._old_buckets is None and n > self._grow_at:
+                capacity = self.capacity
+                while n > capacity * self.load_factor:
+                    capacity *= 2
+                self._start_resize(capacity)
+
+        while self._old_buckets is not None:
+            self._rehash_step()
+
+    @contextlib.contextmanager
+    def _all_locks(self):
+        with contextlib.ExitStack() as stack:
+            for lock in self.locks:
+                stack.enter_context(lock)
+            yield
 
     def put(self, key, value):
         """
@@ -18,19 +179,20 @@ class ConcurrentHashMap(HashMap):
         If key exists, updates value. Otherwise, adds new node to bucket.
         Time: O(1) average, O(N) worst-case (linked list length).
         """
-        index = self._hash(key)
-        with self.locks[index]:
-            return super().put(key, value)
+        stripe = self._stripe(key)
+        with self.locks[stripe]:
+            if self._put(key, value):
+                self._counts[stripe] += 1
+        self._maintain()
+        return True
 
     def get(self, key):
         """
-        Retrieves value by key.
+        Retrieves value by key without locking.
         Returns None if not found.
         Time: O(1) average, O(N) worst-case.
         """
-        index = self._hash(key)
-        with self.locks[index]:
-            return super().get(key)
+        return self._get(key)
 
     def remove(self, key):
         """
@@ -38,15 +200,144 @@ class ConcurrentHashMap(HashMap):
         Returns removed value or None.
         Time: O(1) average, O(N) worst-case.
         """
-        index = self._hash(key)
-        with self.locks[index]:
-            return super().remove(key)
+        stripe = self._stripe(key)
+        with self.locks[stripe]:
+            node = self._remove(key)
+            if node:
+                self._counts[stripe] -= 1
+        self._maintain()
+        return node.val if node else None
+
+    def _compute(self, stripe, key, remap):
+        """
+        Replaces the key's value with `remap(old)` in a single bucket walk, with
+        the stripe held. `old` is None for a missing key and a None result
+        removes it. Returns `(old, new)`.
+        """
+        buckets, index = self._locate(key)
+        prev, node = None, buckets[index]
+        while node and node.key != key:
+            prev, node = node, node.next
+
+        old = node.val if node else None
+        new = remap(old)
+        if node:
+            if new is not None:
+                node.val = new
+            else:
+                if prev:
+                    prev.next = node.next
+                else:
+                    buckets[index] = node.next
+                self._counts[stripe] -= 1
+        elif new is not None:
+            buckets[index] = HashNode(key, new, buckets[index])
+            self._counts[stripe] += 1
+        return old, new
+
+    def _atomic(self, key, remap):
+        stripe = self._stripe(key)
+        with self.locks[stripe]:
+            result = self._compute(stripe, key, remap)
+        self._maintain()
+        return result
+
+    def compute(self, key, fn):
+        """
+        Atomically sets the value to `fn(key, old)`, `old` being None if absent.
+        A None result removes the key. Returns the new value.
+        """
+        return self._atomic(key, lambda old: fn(key, old))[1]
+
+    def compute_if_absent(self, key, fn):
+        """
+        Atomically inserts `fn(key)` if the key is absent. Returns the current value.
+        """
+        return self._atomic(key, lambda old: fn(key) if old is None else old)[1]
+
+    def merge(self, key, value, fn):
+        """
+        Atomically inserts `value` if the key is absent, otherwise sets the value
+        to `fn(old, value)`. A None result removes the key. Returns the new value.
+        """
+        return self._atomic(key, lambda old: value if old is None else fn(old, value))[1]
+
+    def put_if_absent(self, key, value):
+        """
+        Atomically inserts the pair if the key is absent.
+        Returns the existing value, or None if it was inserted.
+        """
+        return self._atomic(key, lambda old: value if old is None else old)[0]
 
     def increment(self, key, delta=1):
-        index = self._hash(key)
-        with self.locks[index]:
-            val = super().get(key) or 0
-            super().put(key, val + delta)
+        return self.merge(key, delta, operator.add)
+
+    def put_all(self, items):
+        """
+        Inserts or updates every pair of a mapping or an iterable of pairs,
+        taking each stripe's lock once for the whole batch.
+        """
+        if hasattr(items, "items"):
+            items = items.items()
+
+        n = len(self.locks)
+        batches = [[] for _ in range(n)]
+        for key, value in items:
+            batches[hash(key) % n].append((key, value))
+
+        total = sum(len(batch) for batch in batches)
+        if self.size + total > self._grow_at:
+            self._reserve(self.size + total)
+
+        for stripe, batch in enumerate(batches):
+            if not batch:
+                continue
+            with self.locks[stripe]:
+                added = 0
+                for key, value in batch:
+                    added += self._put(key, value)
+                self._counts[stripe] += added
+            self._maintain()
+        return True
+
+    def get_many(self, keys):
+        """
+        Returns the values of `keys` in order, None for missing ones.
+        Reads take no lock, so the batch needs no grouping.
+        """
+        return [self._get(key) for key in keys]
+
+    def enable_stats(self, callback=None):
+        """
+        Also counts acquisitions of and waits for every stripe lock. Wrapped
+        locks share the underlying ones, so this is safe while in use.
+        """
+        self.disable_stats()
+        instrumentation.enable(self, _ConcurrentHashMapStats, callback)
+        self.locks = [instrumentation.TimedLock(lock) for lock in self.locks]
+
+    def disable_stats(self):
+        if self._stats is not None:
+            self.locks = [lock.lock for lock in self.locks]
+        super().disable_stats()
+
+    def stats(self):
+        result = super().stats()
+        if self._stats is not None:
+            result["locks"] = [lock.snapshot() for lock in self.locks]
+        return result
+
+    def _settings(self):
+        return {"concurrency": len(self.locks)}
+
+    def _load(self, entries):
+        # `load` feeds the presized map one snapshot chunk per batch
+        entries = iter(entries)
+        while True:
+            chunk = list(itertools.islice(entries, snapshot.CHUNK_SIZE))
+            if not chunk:
+                break
+            self.put_all(chunk)
 
     def __getitem__(self, key):
         return self.get(key)
@@ -64,18 +355,55 @@ class ConcurrentHashMap(HashMap):
         return self.size
 
     def __iter__(self):
-        for i, bucket in enumerate(self.buckets):
-            with self.locks[i]:
+        # snapshot: writers and bucket moves are excluded while the locks are held
+        with self._all_locks():
+            buckets, old_buckets = self._tables()
+            items = []
+            for bucket in (old_buckets or []) + buckets:
                 node = bucket
-                while node:
-                    yield (node.key, node.val)
+                while node and node is not _MOVED:
+                    items.append((node.key, node.val))
                     node = node.next
+        yield from items
+
+
+class _ConcurrentHashMapStats(_HashMapStats):
+    """
+    Also instruments the lock-free `_get` behind `get` and `get_many`.
+    """
+
+    def _get(self, key):
+        comparisons = 0
+        node = self._chain(key)
+        while node:
+            comparisons += 1
+            if node.key == key:
+                break
+            node = node.next
+        self._stats.observe("comparisons_per_lookup", comparisons)
+        return node.val if node else None
+
 
 def test_put_fn(hashmap, key):
     n = 100
     for _ in range(n):
         hashmap.increment(key)
 
+def stress_writer_fn(hashmap, worker, n, rounds):
+    # fills and drains a private key range, so the table keeps growing and shrinking
+    keys = [(worker, i) for i in range(n)]
+    for _ in range(rounds):
+        for key in keys:
+            hashmap.put(key, key)
+        for key in keys[n // 2:]:
+            assert hashmap.remove(key) == key
+
+def stress_reader_fn(hashmap, keys, done, errors):
+    while not done.is_set():
+        for key in keys:
+            if hashmap.get(key) != key:
+                errors.append(key)
+
 if __name__ == "__main__":
     hashmap = ConcurrentHashMap()
 
@@ -108,4 +436,98 @@ if __name__ == "__main__":
     print(hashmap["apple"])
     assert hashmap["apple"] == 100 * 3
 
+    threads = [threading.Thread(target=test_put_fn, args=(hashmap, i)) for i in range(200)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(hashmap[i] == 100 for i in range(200))
+    assert hashmap.capacity > 200
+
+    hashmap = ConcurrentHashMap()
+    assert hashmap.put_if_absent("a", 1) is None
+    assert hashmap.put_if_absent("a", 2) == 1
+    assert hashmap.compute_if_absent("b", lambda key: key * 2) == "bb"
+    assert hashmap.compute_if_absent("b", lambda key: "never") == "bb"
+    assert hashmap.compute("a", lambda key, old: old + 10) == 11
+    assert hashmap.compute("b", lambda key, old: None) is None
+    assert "b" not in hashmap and len(hashmap) == 1
+    assert hashmap.merge("c", 5, operator.add) == 5
+    assert hashmap.merge("c", 5, operator.add) == 10
+    hashmap.put_all({i: i for i in range(1000)})
+    hashmap.put_all((i, -i) for i in range(500))
+    assert len(hashmap) == 1002
+    assert hashmap.get_many([0, 999, "a", "missing"]) == [0, 999, 11, None]
+
+    # stress: concurrent resizes under lock-free readers
+    hashmap = ConcurrentHashMap()
+    stable = [("stable", i) for i in range(100)]
+    for key in stable:
+        hashmap.put(key, key)
+
+    # a reader reads the tables, then a resize moves its bucket before it reads it
+    while hashmap._old_buckets is not None:
+        hashmap._rehash_step()
+    stale = hashmap._tables()
+    with hashmap._resize_lock:
+        hashmap._start_resize(hashmap.capacity * 2)
+    while hashmap._old_buckets is not None:
+        hashmap._rehash_step()
+    for key in stable:
+        reads = [stale]
+        hashmap._tables = lambda: reads.pop() if reads else ConcurrentHashMap._tables(hashmap)
+        assert hashmap.get(key) == key and not reads
+    del hashmap._tables
+
+    done, errors = threading.Event(), []
+    readers = [threading.Thread(target=stress_reader_fn, args=(hashmap, stable, done, errors)) for _ in range(4)]
+    writers = [threading.Thread(target=stress_writer_fn, args=(hashmap, w, 1000, 3)) for w in range(8)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert not errors, errors[:10]
+    assert len(hashmap) == len(stable) + 8 * 500
+    assert len(list(hashmap)) == len(hashmap)
+    assert all(hashmap[(w, i)] == (w, i) for w in range(8) for i in range(500))
+
+    # a reloaded map keeps its capacity a multiple of the stripes while shrinking
+    import io
+
+    hashmap = ConcurrentHashMap()
+    hashmap.put_all((i, i) for i in range(1000))
+    buffer = io.BytesIO()
+    hashmap.dump(buffer)
+    buffer.seek(0)
+    hashmap = ConcurrentHashMap.load(buffer)
+    assert len(hashmap) == 1000 and hashmap.capacity == 16 * 2 ** 7 and hashmap._old_buckets is None
+    capacities = {hashmap.capacity}
+    for i in range(1000):
+        hashmap.remove(i)
+        capacities.add(hashmap.capacity)
+    for _ in range(10_000):
+        hashmap.remove(0)
+        capacities.add(hashmap.capacity)
+    assert hashmap.capacity == 16 and all(capacity % 16 == 0 for capacity in capacities)
+
+    hashmap = ConcurrentHashMap(concurrency=4)
+    hashmap.put_all((i, i) for i in range(100))
+    buffer = io.BytesIO()
+    hashmap.dump(buffer)
+    buffer.seek(0)
+    assert len(ConcurrentHashMap.load(buffer).locks) == 4
+
+    # lock-free reads are counted like HashMap lookups
+    hashmap = ConcurrentHashMap()
+    hashmap.put_all((i, i) for i in range(100))
+    hashmap.enable_stats()
+    assert hashmap.get(7) == 7 and hashmap.get("missing") is None
+    assert hashmap.get_many([1, 2]) == [1, 2]
+    assert sum(hashmap.stats()["histograms"]["comparisons_per_lookup"].values()) == 4
+    hashmap.disable_stats()
+
     print("OK!")
\ No newline at end of file
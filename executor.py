@@ -0,0 +1,226 @@
+"""
+Work-stealing thread pool for fork/join task trees.
+
+Every worker owns a `WorkStealingDeque`. Tasks submitted by a worker go on top
+of its own deque and it runs them LIFO, so a task tree is walked depth first
+by the thread that built it, without any lock. A worker whose deque is empty
+steals the oldest task, usually the root of a large subtree, from the bottom
+of another worker's deque. A worker calling `future.result()` on a subtask
+keeps running queued tasks until the subtask is done instead of blocking its
+thread, so trees run on `max_workers` threads as long as joins nest less than
+`MAX_HELP_DEPTH` deep on one thread. Every level of nesting costs a few stack
+frames; a deeper join blocks its worker and starts a stand-in thread that
+helps on the worker's deque until the join is done, so chains of any depth
+finish, on one extra thread per `MAX_HELP_DEPTH` levels.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import Executor, Future, wait
+
+from stack import WorkStealingDeque
+
+
+class TaskFuture(Future):
+    def __init__(self, executor):
+        super().__init__()
+        self._executor = executor
+
+    def result(self, timeout=None):
+        return super().result(self._executor._help(self, timeout))
+
+    def exception(self, timeout=None):
+        return super().exception(self._executor._help(self, timeout))
+
+
+class WorkStealingExecutor(Executor):
+    # seconds a joining worker with nothing to run waits before looking again
+    HELP_INTERVAL = 0.001
+    # joins a thread runs tasks inside of, about five frames each
+    MAX_HELP_DEPTH = 50
+
+    def __init__(self, max_workers=None):
+        """
+        `concurrent.futures` executor running tasks on `max_workers` threads
+        (the CPU count by default) with one deque each, plus a stand-in
+        thread for each worker blocked in a join nested past `MAX_HELP_DEPTH`.
+        Submits from outside the pool are spread round robin over the deques,
+        submits from a task go to its worker's deque, also after `shutdown`,
+        which lets running trees finish.
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+
+        self._deques = [WorkStealingDeque() for _ in range(max_workers)]
+        self._local = threading.local()
+        self._idle = threading.Condition()
+        self._sleeping = 0
+        self._next = 0
+        self._shutdown = False
+        self._threads = [threading.Thread(target=self._work, args=(index,), daemon=True)
+                         for index in range(max_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, /, *args, **kwargs):
+        index = getattr(self._local, "index", None)
+        if index is None:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            index = self._next = (self._next + 1) % len(self._deques)
+
+        future = TaskFuture(self)
+        self._deques[index].push((future, fn, args, kwargs))
+        # a sleeper counts itself before its last look at the deques, so it
+        # either sees this task or is woken up here
+        if self._sleeping:
+            with self._idle:
+                self._idle.notify()
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._idle:
+            self._shutdown = True
+            if cancel_futures:
+                for deque in self._deques:
+                    while len(deque):
+                        try:
+                            deque.steal()[0].cancel()
+                        except IndexError:
+                            break
+            self._idle.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _find(self, index):
+        """
+        Pops the newest task of worker `index`, or steals the oldest task of a
+        random victim; returns None if every deque is empty.
+        """
+        try:
+            return self._deques[index].pop()
+        except IndexError:
+            pass
+
+        count = len(self._deques)
+        start = random.randrange(count)
+        for i in range(count):
+            try:
+                return self._deques[(start + i) % count].steal()
+            except IndexError:
+                pass
+        return None
+
+    @staticmethod
+    def _run(task):
+        future, fn, args, kwargs = task
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def _work(self, index):
+        self._local.index = index
+        while True:
+            task = self._find(index)
+            if task is not None:
+                self._run(task)
+                continue
+
+            with self._idle:
+                if not any(self._deques):
+                    if self._shutdown:
+                        return
+                    self._sleeping += 1
+                    if not any(self._deques):
+                        self._idle.wait()
+                    self._sleeping -= 1
+
+    def _help(self, future, timeout):
+        """
+        Runs queued tasks on a worker thread until `future` is done or
+        `timeout` runs out; returns the time left for the final wait.
+        """
+        index = getattr(self._local, "index", None)
+        if index is None or future.done():
+            return timeout
+
+        depth = getattr(self._local, "depth", 0)
+        if depth >= self.MAX_HELP_DEPTH:
+            # no room for more tasks on this stack: block, a fresh one helps
+            threading.Thread(target=self._stand_in, args=(index, future), daemon=True).start()
+            return timeout
+
+        self._local.depth = depth + 1
+        try:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not future.done():
+                if deadline is not None and time.monotonic() >= deadline:
+                    return 0
+                task = self._find(index)
+                if task is None:
+                    wait([future], self.HELP_INTERVAL)
+                else:
+                    self._run(task)
+            return 0
+        finally:
+            self._local.depth = depth
+
+    def _stand_in(self, index, future):
+        # shares worker `index`'s deque, the deque ops are atomic
+        self._local.index = index
+        self._help(future, None)
+
+
+if __name__ == "__main__":
+    def fib(executor, n):
+        if n < 2:
+            return n
+        left = executor.submit(fib, executor, n - 1)
+        right = executor.submit(fib, executor, n - 2)
+        return left.result() + right.result()
+
+    # deeper than the pool is wide: joins run other tasks instead of blocking
+    with WorkStealingExecutor(max_workers=2) as executor:
+        assert executor.submit(fib, executor, 15).result() == 610
+        assert list(executor.map(pow, range(10), [2] * 10)) == [i * i for i in range(10)]
+
+        def chain(executor, n):
+            return n if not n else executor.submit(chain, executor, n - 1).result() + 1
+
+        # far past the recursion limit of one thread's stack
+        assert executor.submit(chain, executor, 2000).result() == 2000
+
+        future = executor.submit(divmod, 1, 0)
+        assert isinstance(future.exception(), ZeroDivisionError)
+        try:
+            future.result()
+            assert False
+        except ZeroDivisionError:
+            pass
+
+    try:
+        executor.submit(fib, executor, 1)
+        assert False
+    except RuntimeError:
+        pass
+
+    executor = WorkStealingExecutor(max_workers=1)
+    started, gate = threading.Event(), threading.Event()
+    blocker = executor.submit(lambda: started.set() or gate.wait())
+    started.wait()
+    pending = [executor.submit(fib, executor, 10) for _ in range(5)]
+    executor.shutdown(wait=False, cancel_futures=True)
+    gate.set()
+    executor.shutdown()
+    assert blocker.result() is True
+    assert all(future.cancelled() for future in pending)
+    print("OK!")
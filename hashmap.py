@@ -1,3 +1,13 @@
+import array
+import collections
+import itertools
+import time
+
+import instrumentation
+import snapshot
+from avl_tree import AVLTree
+
+
 class HashNode:
     def __init__(self, key=None, val=None, next=None):
         self.key = key
@@ -8,20 +18,237 @@ class HashNode:
         return f"({self.key}: {self.val})"
 
 
+def _orderable(key):
+    # `<` has to be a strict weak order: sets are only partially ordered and
+    # NaN is unordered, so floats and sets are grouped by hash
+    return type(key).__lt__ is not object.__lt__ and not isinstance(key, (float, set, frozenset))
+
+
+class _BinKey:
+    """
+    Tree key of an ordered `TreeBin`: hash, then the key's `<`, then the order
+    of insertion for keys that aren't less than each other but aren't equal.
+    """
+    __slots__ = ("hash", "key", "serial")
+
+    def __init__(self, hash, key, serial):
+        self.hash = hash
+        self.key = key
+        self.serial = serial
+
+    def __lt__(self, other):
+        if self.hash != other.hash:
+            return self.hash < other.hash
+        if self.serial == other.serial:
+            return False
+        if self.key < other.key:
+            return True
+        if other.key < self.key:
+            return False
+        return self.serial < other.serial
+
+    def __gt__(self, other):
+        return other < self
+
+    def __eq__(self, other):
+        return self.serial == other.serial
+
+
+class TreeBin:
+    def __init__(self, head):
+        """
+        A bucket whose chain grew too long, holding the chain's nodes in an
+        `AVLTree`, so a bucket of colliding keys costs O(log n) per lookup.
+
+        Orderable keys are sorted by hash, then `<`; keys that `<` can't tell
+        apart are told apart by `==` and kept in insertion order, and a lookup
+        searches both sides of them. Once a key can't be ordered with the
+        others the bin regroups by hash alone: the tree maps each hash to the
+        list of its nodes, still O(log n) unless the hashes are equal too.
+        """
+        self.ordered = True
+        self.tree = AVLTree()
+        self.size = 0
+        self._serials = itertools.count()
+        while head:
+            next_node = head.next
+            self.add(head)
+            head = next_node
+
+    def _unorder(self):
+        nodes = list(self)
+        self.ordered = False
+        self.tree = AVLTree()
+        self.size = 0
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _locate(tree_node, h, key):
+        # returns the tree node holding the key
+        while tree_node is not None:
+            stored = tree_node.val
+            if h != stored.hash:
+                tree_node = tree_node.left if h < stored.hash else tree_node.right
+            elif stored.key is key or stored.key == key:
+                return tree_node
+            elif key < stored.key:
+                tree_node = tree_node.left
+            elif stored.key < key:
+                tree_node = tree_node.right
+            else:
+                found = TreeBin._locate(tree_node.right, h, key)
+                if found is not None:
+                    return found
+                tree_node = tree_node.left
+        return None
+
+    def find(self, key):
+        """
+        Returns the node holding the key, or None; O(log n)
+        """
+        if self.ordered:
+            try:
+                found = self._locate(self.tree.root, hash(key), key)
+                return found.value if found else None
+            except Exception:
+                # `<` failed between two keys: stop ordering them
+                self._unorder()
+
+        for node in self.tree[hash(key)] or ():
+            if node.key == key:
+                return node
+        return None
+
+    def add(self, node):
+        """
+        Adds the node of a key that isn't in the bin yet; O(log n)
+        """
+        node.next = None
+        if self.ordered:
+            try:
+                if _orderable(node.key):
+                    self.tree.insert(_BinKey(hash(node.key), node.key, next(self._serials)), node)
+                    self.size += 1
+                    return
+            except Exception:
+                pass
+            # a failed insert may have touched subtree sizes, rebuild
+            self._unorder()
+
+        h = hash(node.key)
+        group = self.tree[h]
+        if group is None:
+            self.tree.insert(h, [node])
+        else:
+            group.append(node)
+        self.size += 1
+
+    def remove(self, key):
+        """
+        Removes and returns the node holding the key, or None; O(log n)
+        """
+        if self.ordered:
+            try:
+                found = self._locate(self.tree.root, hash(key), key)
+                if found is None:
+                    return None
+                # the tree may move another entry into the removed tree node
+                node = found.value
+                self.tree.remove(found.val)
+                self.size -= 1
+                return node
+            except Exception:
+                self._unorder()
+
+        node = self.find(key)
+        if node is None:
+            return None
+        group = self.tree[hash(key)]
+        group.remove(node)
+        if not group:
+            self.tree.remove(hash(key))
+        self.size -= 1
+        return node
+
+    def chain(self):
+        """
+        Links the nodes back into a plain chain and returns its head.
+        """
+        head = None
+        for node in self:
+            node.next = head
+            head = node
+        return head
+
+    def height(self):
+        return self.tree.get_height(self.tree.root)
+
+    def __iter__(self):
+        for _, value in self.tree.items():
+            if self.ordered:
+                yield value
+            else:
+                yield from value
+
+    def __len__(self):
+        return self.size
+
+
 class HashMap:
-    def __init__(self, capacity=10):
+    # Old-table buckets migrated per operation while a resize is in progress.
+    REHASH_STEP = 4
+    # A chain reaching this length turns into a `TreeBin`, which turns back
+    # into a chain once it shrinks to the lower bound.
+    TREEIFY_THRESHOLD = 8
+    UNTREEIFY_THRESHOLD = 6
+    # set on instances switched over by `enable_stats`
+    _stats = None
+
+    def __init__(self, capacity=10, load_factor=0.75):
         """
-        Initializes the hashmap with a fixed-size array of buckets (linked lists).
+        Initializes the hashmap with an array of buckets (linked lists).
+
+        The table doubles once `size` exceeds `load_factor * capacity` and halves
+        once it drops below a quarter of that, never going under the initial
+        capacity. Rehashing is incremental: while a resize is in progress every
+        operation moves `REHASH_STEP` buckets of the old table into the new one,
+        so no single call pays for the whole resize.
         """
+        if capacity < 1:
+            raise ValueError("Capacity must be positive")
+        if load_factor <= 0:
+            raise ValueError("Load factor must be positive")
+
         self.capacity = capacity
+        self.load_factor = load_factor
         self.buckets = [None] * self.capacity
         self.size = 0
 
-    def _hash(self, key):
+        self._min_capacity = capacity
+        # buckets of `_old_buckets` below `_rehash_idx` are already moved
+        self._old_buckets = None
+        self._rehash_idx = 0
+        self._set_thresholds()
+
+    def _hash(self, key, capacity=None):
         """
         Computes hash index for the key.
         """
-        return hash(key) % self.capacity
+        return hash(key) % (capacity or self.capacity)
+
+    def _locate(self, key):
+        """
+        Returns the table and the bucket index currently holding the key.
+        Keys of old buckets that are not migrated yet still live in the old table.
+        """
+        h = hash(key)
+        old_buckets = self._old_buckets
+        if old_buckets is not None:
+            index = h % len(old_buckets)
+            if index >= self._rehash_idx:
+                return old_buckets, index
+        return self.buckets, h % self.capacity
 
     def put(self, key, value):
         """
@@ -29,65 +256,188 @@ class HashMap:
         If key exists, updates value. Otherwise, adds new node to bucket.
         Time: O(1) average, O(N) worst-case (linked list length).
         """
-        index = self._hash(key)
-        node = self.buckets[index]
+        if self._put(key, value):
+            self.size += 1
+        self._maintain()
+        return True
+
+    def get(self, key):
+        """
+        Retrieves value by key.
+        Returns None if not found.
+        Time: O(1) average, O(N) worst-case.
+        """
+        val = self._get(key)
+        self._maintain()
+        return val
+
+    def remove(self, key):
+        """
+        Removes key-value pair by key.
+        Returns removed value or None.
+        Time: O(1) average, O(N) worst-case.
+        """
+        node = self._remove(key)
+        if node:
+            self.size -= 1
+        self._maintain()
+        return node.val if node else None
+
+    def _put(self, key, value):
+        """
+        Returns True if a new node was added, False if the value was updated.
+        """
+        buckets, index = self._locate(key)
+        node = buckets[index]
 
         if not node:
-            self.buckets[index] = HashNode(key, value)
-            self.size += 1
+            buckets[index] = HashNode(key, value)
+            return True
+
+        if type(node) is TreeBin:
+            found = node.find(key)
+            if found:
+                found.val = value
+                return False
+            node.add(HashNode(key, value))
             return True
 
+        length = 1
         while node:
             if node.key == key:
                 node.val = value
-                return True
+                return False
             if not node.next:
                 break
             node = node.next
+            length += 1
 
         node.next = HashNode(key, value)
-        self.size += 1
+        if length + 1 >= self.TREEIFY_THRESHOLD:
+            buckets[index] = TreeBin(buckets[index])
         return True
 
-    def get(self, key):
+    def _find(self, key):
         """
-        Retrieves value by key.
-        Returns None if not found.
-        Time: O(1) average, O(N) worst-case.
+        Returns the node holding the key, or None.
         """
-        index = self._hash(key)
-        node = self.buckets[index]
+        buckets, index = self._locate(key)
+        node = buckets[index]
+        if type(node) is TreeBin:
+            return node.find(key)
 
         while node:
             if node.key == key:
-                return node.val
+                return node
             node = node.next
 
         return None
 
-    def remove(self, key):
+    def _get(self, key):
+        node = self._find(key)
+        return node.val if node else None
+
+    def _remove(self, key):
         """
-        Removes key-value pair by key.
-        Returns removed value or None.
-        Time: O(1) average, O(N) worst-case.
+        Unlinks and returns the node holding the key, or None.
         """
-        index = self._hash(key)
-        node = self.buckets[index]
+        buckets, index = self._locate(key)
+        node = buckets[index]
         prev = None
 
+        if type(node) is TreeBin:
+            removed = node.remove(key)
+            if len(node) <= self.UNTREEIFY_THRESHOLD:
+                buckets[index] = node.chain()
+            return removed
+
         while node:
             if node.key == key:
                 if prev:
                     prev.next = node.next
                 else:
-                    self.buckets[index] = node.next
-                self.size -= 1
-                return node.val
+                    buckets[index] = node.next
+                return node
             prev = node
             node = node.next
 
         return None
 
+    def _set_thresholds(self):
+        self._grow_at = self.capacity * self.load_factor
+        if self.capacity > self._min_capacity:
+            self._shrink_at = self._grow_at / 4
+        else:
+            self._shrink_at = 0
+
+    def _maintain(self):
+        """
+        Advances an in-progress rehash, or starts a resize once the load factor
+        leaves the allowed range. Called after every operation.
+        """
+        if self._old_buckets is not None:
+            self._rehash_step()
+        elif self.size > self._grow_at:
+            self._start_resize(self.capacity * 2)
+        elif self.size < self._shrink_at:
+            self._start_resize(self.capacity // 2)
+
+    def _start_resize(self, new_capacity):
+        self._old_buckets = self.buckets
+        self._rehash_idx = 0
+        self.buckets = [None] * new_capacity
+        self.capacity = new_capacity
+        self._set_thresholds()
+        self._rehash_step()
+
+    def _rehash_step(self):
+        """
+        Moves the next `REHASH_STEP` old buckets into the new table; O(1) amortized.
+        """
+        old_buckets = self._old_buckets
+        end = min(self._rehash_idx + self.REHASH_STEP, len(old_buckets))
+
+        for i in range(self._rehash_idx, end):
+            node = old_buckets[i]
+            if type(node) is TreeBin:
+                self._move_bin(node)
+                node = None
+            while node:
+                next_node = node.next
+                index = self._hash(node.key)
+                if type(self.buckets[index]) is TreeBin:
+                    self.buckets[index].add(node)
+                else:
+                    node.next = self.buckets[index]
+                    self.buckets[index] = node
+                node = next_node
+            old_buckets[i] = None
+
+        self._rehash_idx = end
+        if end == len(old_buckets):
+            self._old_buckets = None
+            self._rehash_idx = 0
+
+    def _move_bin(self, tree_bin):
+        """
+        Splits a tree bin of the old table over the new one. Parts still
+        longer than `UNTREEIFY_THRESHOLD` stay trees, the rest become chains.
+        """
+        parts = collections.defaultdict(list)
+        for node in tree_bin:
+            parts[self._hash(node.key)].append(node)
+
+        for index, nodes in parts.items():
+            head = self.buckets[index]
+            if type(head) is TreeBin:
+                for node in nodes:
+                    head.add(node)
+                continue
+            for node in nodes:
+                node.next = head
+                head = node
+            self.buckets[index] = TreeBin(head) if len(nodes) > self.UNTREEIFY_THRESHOLD else head
+
     def __getitem__(self, key):
         return self.get(key)
 
@@ -103,31 +453,418 @@ class HashMap:
     def __len__(self):
         return self.size
 
+    @staticmethod
+    def _nodes(bucket):
+        if type(bucket) is TreeBin:
+            yield from bucket
+            return
+        while bucket:
+            yield bucket
+            bucket = bucket.next
+
     def __iter__(self):
         for bucket in self.buckets:
-            node = bucket
-            while node:
+            for node in self._nodes(bucket):
                 yield (node.key, node.val)
-                node = node.next
+
+        if self._old_buckets is not None:
+            for bucket in self._old_buckets[self._rehash_idx:]:
+                for node in self._nodes(bucket):
+                    yield (node.key, node.val)
+
+    def _settings(self):
+        """
+        Constructor arguments besides the capacity and load factor, saved by
+        `dump` for `load`.
+        """
+        return {}
+
+    def dump(self, fp):
+        """
+        Writes the entries to the binary file `fp` as a flat snapshot; O(N)
+        """
+        meta = {"capacity": self._min_capacity, "load_factor": self.load_factor, "settings": self._settings()}
+        snapshot.dump(fp, "HashMap", meta, len(self), iter(self))
+
+    @classmethod
+    def load(cls, fp):
+        """
+        Rebuilds a map written by `dump` with the table presized for all the
+        entries, so nothing is rehashed; O(N) holding one chunk of the file.
+        """
+        meta, count, entries = snapshot.load(fp, "HashMap")
+        # resizes double and halve, keep the table `_min_capacity * 2 ** k` so
+        # later shrinks stop at the initial capacity
+        capacity = meta["capacity"]
+        while count > capacity * meta["load_factor"]:
+            capacity *= 2
+        hashmap = cls(capacity=capacity, load_factor=meta["load_factor"], **meta.get("settings", {}))
+        # the table starts out empty: it may shrink only once it is filled
+        hashmap._load(entries)
+        hashmap._min_capacity = meta["capacity"]
+        hashmap._set_thresholds()
+        return hashmap
+
+    def _load(self, entries):
+        for key, value in entries:
+            if self._put(key, value):
+                self.size += 1
+
+    def enable_stats(self, callback=None):
+        """
+        Starts counting comparisons per lookup and timing resizes, see `stats`.
+        `callback(name, fields)` receives every resize event as it happens.
+        Once enabled, `get` and `put` stay about 15-25% slower even after
+        `disable_stats`, see `instrumentation`.
+        """
+        instrumentation.enable(self, _HashMapStats, callback)
+
+    def disable_stats(self):
+        instrumentation.disable(self)
+
+    def stats(self):
+        """
+        Returns the size, capacity and histograms of chain lengths and tree bin
+        sizes of the current table, plus counters, histograms and recent events while stats are
+        enabled; O(capacity)
+        """
+        chains = collections.Counter()
+        tree_bins = collections.Counter()
+        for bucket in self.buckets:
+            if type(bucket) is TreeBin:
+                tree_bins[len(bucket)] += 1
+            else:
+                chains[sum(1 for _ in self._nodes(bucket))] += 1
+
+        result = {
+            "size": len(self),
+            "capacity": self.capacity,
+            "resizing": self._old_buckets is not None,
+            "chain_lengths": dict(sorted(chains.items())),
+            "tree_bin_sizes": dict(sorted(tree_bins.items())),
+        }
+        if self._stats is not None:
+            result.update(self._stats.snapshot())
+        return result
+
+
+class _HashMapStats:
+    """
+    Instrumented overrides put in front of a map's class by `enable_stats`.
+    """
+
+    def _find(self, key):
+        node = super()._find(key)
+        buckets, index = self._locate(key)
+        if type(buckets[index]) is TreeBin:
+            # at most one comparison per level of the bin's tree
+            self._stats.observe("tree_bin_lookup_depth", buckets[index].height())
+            return node
+
+        comparisons = 0
+        current = buckets[index]
+        while current:
+            comparisons += 1
+            if current is node:
+                break
+            current = current.next
+        self._stats.observe("comparisons_per_lookup", comparisons)
+        return node
+
+    def _start_resize(self, new_capacity):
+        self._stats.event("resize", old_capacity=self.capacity, new_capacity=new_capacity)
+        self._resize_started = time.perf_counter()
+        super()._start_resize(new_capacity)
+
+    def _rehash_step(self):
+        super()._rehash_step()
+        self._stats.count("rehash_steps")
+        if self._old_buckets is None:
+            # pop is atomic, so only one of racing threads reports the rehash
+            started = self.__dict__.pop("_resize_started", None)
+            if started is not None:
+                self._stats.event("rehash_done", capacity=self.capacity, seconds=time.perf_counter() - started)
+
+
+# `_indices` markers: never used slot / slot of a removed entry
+_EMPTY = -1
+_DUMMY = -2
+# stands in for the key of a removed entry in the dense arrays
+_DELETED = object()
+
+
+class CompactHashMap:
+    MIN_CAPACITY = 8
+
+    def __init__(self, capacity=8):
+        """
+        Initializes an open-addressing hashmap laid out like CPython's compact dict.
+
+        Entries live in dense parallel arrays (`_hashes`, `_keys`, `_values`) in
+        insertion order; the sparse `_indices` table only holds entry positions
+        and is probed with the perturbed sequence. Hashes are cached, so probing
+        and resizing never call `__hash__` and only compare keys on a hash match.
+        """
+        self.capacity = self._table_size(capacity)
+        self.size = 0
+        self._min_capacity = self.capacity
+        self._indices = self._new_indices(self.capacity)
+        self._hashes = array.array("q")
+        self._keys = []
+        self._values = []
+
+    @classmethod
+    def _table_size(cls, n):
+        size = cls.MIN_CAPACITY
+        while size < n:
+            size *= 2
+        return size
+
+    @staticmethod
+    def _new_indices(capacity):
+        """
+        Smallest signed array type able to hold every entry position.
+        """
+        for typecode, limit in (("b", 1 << 7), ("h", 1 << 15), ("i", 1 << 31)):
+            if capacity <= limit:
+                return array.array(typecode, [_EMPTY]) * capacity
+        return array.array("q", [_EMPTY]) * capacity
+
+    def _probe(self, key, h):
+        """
+        Returns `(slot, entry)` for the key: the index slot holding it and its
+        position in the entry arrays, or the slot to insert into and -1.
+        """
+        indices = self._indices
+        mask = self.capacity - 1
+        perturb = h & 0xFFFFFFFFFFFFFFFF
+        slot = h & mask
+        free = -1
+
+        while True:
+            ix = indices[slot]
+            if ix == _EMPTY:
+                return (slot if free < 0 else free), -1
+            if ix == _DUMMY:
+                if free < 0:
+                    free = slot
+            elif self._hashes[ix] == h:
+                k = self._keys[ix]
+                if k is key or k == key:
+                    return slot, ix
+            perturb >>= 5
+            slot = (slot * 5 + perturb + 1) & mask
+
+    def put(self, key, value):
+        """
+        Inserts or updates a key-value pair.
+        Time: O(1) average, O(N) worst-case (probe sequence length).
+        """
+        h = hash(key)
+        slot, ix = self._probe(key, h)
+        if ix >= 0:
+            self._values[ix] = value
+            return True
+
+        if len(self._keys) * 3 >= self.capacity * 2:
+            self._resize((self.size + 1) * 3)
+            slot, _ = self._probe(key, h)
+
+        self._indices[slot] = len(self._keys)
+        self._hashes.append(h)
+        self._keys.append(key)
+        self._values.append(value)
+        self.size += 1
+        return True
+
+    def get(self, key):
+        """
+        Retrieves value by key.
+        Returns None if not found.
+        Time: O(1) average, O(N) worst-case.
+        """
+        _, ix = self._probe(key, hash(key))
+        return self._values[ix] if ix >= 0 else None
+
+    def remove(self, key):
+        """
+        Removes key-value pair by key.
+        Returns removed value or None.
+        Time: O(1) amortized.
+        """
+        slot, ix = self._probe(key, hash(key))
+        if ix < 0:
+            return None
+
+        val = self._values[ix]
+        self._indices[slot] = _DUMMY
+        self._keys[ix] = _DELETED
+        self._values[ix] = None
+        self.size -= 1
+
+        if self.size * 8 < self.capacity and self.capacity > self._min_capacity:
+            self._resize(self.size * 3)
+        return val
+
+    def _resize(self, min_capacity):
+        """
+        Drops removed entries and rebuilds the index table from cached hashes; O(N).
+        """
+        live = [ix for ix, k in enumerate(self._keys) if k is not _DELETED]
+        hashes = array.array("q", (self._hashes[ix] for ix in live))
+        self._keys = [self._keys[ix] for ix in live]
+        self._values = [self._values[ix] for ix in live]
+        self._hashes = hashes
+
+        self.capacity = max(self._table_size(min_capacity), self._min_capacity)
+        self._indices = indices = self._new_indices(self.capacity)
+        mask = self.capacity - 1
+        for ix, h in enumerate(hashes):
+            perturb = h & 0xFFFFFFFFFFFFFFFF
+            slot = h & mask
+            while indices[slot] != _EMPTY:
+                perturb >>= 5
+                slot = (slot * 5 + perturb + 1) & mask
+            indices[slot] = ix
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __setitem__(self, key, val):
+        self.put(key, val)
+
+    def __delitem__(self, key):
+        self.remove(key)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for key, val in zip(self._keys, self._values):
+            if key is not _DELETED:
+                yield (key, val)
 
 
 if __name__ == "__main__":
+    import io
+
+    for engine in (HashMap, CompactHashMap):
+        hashmap = engine()
+
+        hashmap.put("apple", 1)
+        hashmap.put("banana", 2)
+        hashmap["orange"] = 3
+        hashmap["banana"] = 10  # update
+
+        assert hashmap.get("apple") == 1
+        assert hashmap["banana"] == 10
+        assert hashmap.remove("orange") == 3
+        assert hashmap.remove("notfound") is None
+        assert "banana" in hashmap
+        del hashmap["banana"]
+        assert "banana" not in hashmap
+
+        for key, value in hashmap:
+            print(f"{key} => {value}")
+
+        n = 10000
+        for i in range(n):
+            hashmap[i] = i
+            assert hashmap[i // 2] == i // 2
+        assert len(hashmap) == n + 1
+        assert hashmap.capacity > n
+        assert sorted(k for k, _ in hashmap if k != "apple") == list(range(n))
+        for i in range(n):
+            assert hashmap.remove(i) == i
+        assert len(hashmap) == 1 and hashmap["apple"] == 1
+        for _ in range(n):
+            hashmap.get("apple")
+        assert hashmap.capacity < 100
+
     hashmap = HashMap()
+    for i in range(10000):
+        hashmap[i] = str(i)
+    buffer = io.BytesIO()
+    hashmap.dump(buffer)
+    buffer.seek(0)
+    loaded = HashMap.load(buffer)
+    assert len(loaded) == 10000 and loaded[1234] == "1234" and loaded._old_buckets is None
+    assert sorted(loaded) == sorted(hashmap) and loaded._min_capacity == 10
+
+    # presized to a doubling of the initial capacity, so shrinks stop at it
+    small = HashMap(capacity=13)
+    for i in range(1000):
+        small[i] = i
+    buffer = io.BytesIO()
+    small.dump(buffer)
+    buffer.seek(0)
+    small = HashMap.load(buffer)
+    assert small.capacity == 13 * 2 ** 7
+    for i in range(1000):
+        small.remove(i)
+    for _ in range(10_000):
+        small.get(0)
+    assert small.capacity == 13
+
+    events = []
+    loaded.enable_stats(callback=lambda name, fields: events.append(name))
+    for i in range(10000, 30000):
+        loaded[i] = i
+    assert loaded.get(5) == "5" and loaded.get(-1) is None
+    stats = loaded.stats()
+    assert "resize" in events and stats["counters"]["rehash_done"] >= 1
+    assert sum(stats["chain_lengths"].values()) == loaded.capacity
+    assert sum(stats["histograms"]["comparisons_per_lookup"].values()) == 2
+    loaded.disable_stats()
+    assert type(loaded) is HashMap and "counters" not in loaded.stats()
+
+    # colliding keys: a long chain turns into a tree bin and back
+    hashmap = HashMap()
+    keys = [i * 10 * 2 ** 20 for i in range(100)] + ["a", "b", 1.5]
+    for key in keys:
+        hashmap[key] = key
+    assert hashmap.stats()["tree_bin_sizes"] and all(hashmap[key] == key for key in keys)
+    assert type(hashmap.buckets[0]) is TreeBin and hashmap.buckets[0].ordered
+    for key in keys[:95]:
+        assert hashmap.remove(key) == key
+    assert not hashmap.stats()["tree_bin_sizes"] and sorted(map(str, dict(hashmap))) == sorted(map(str, keys[95:]))
+
+    # `<` coarser than `==`: tasks of equal priority are neither less nor equal
+    class Task:
+        def __init__(self, name, priority):
+            self.name, self.priority = name, priority
+
+        def __eq__(self, other):
+            return self.name == other.name
+
+        def __hash__(self):
+            return self.priority
+
+        def __lt__(self, other):
+            return self.priority < other.priority
+
+    hashmap = HashMap()
+    tasks = [Task(f"task{i}", i % 5 * 10 * 2 ** 20) for i in range(20)]
+    for task in tasks:
+        hashmap[task] = task.name
+    assert type(hashmap.buckets[0]) is TreeBin and hashmap.buckets[0].ordered
+    assert len(hashmap) == 20 and len(list(hashmap)) == 20
+    assert all(hashmap.get(Task(task.name, task.priority)) == task.name for task in tasks)
+    for task in tasks[::2]:
+        assert hashmap.remove(task) == task.name
+    assert len(hashmap) == 10 and all(hashmap.get(task) == task.name for task in tasks[1::2])
+
+    # a `<` raising something other than TypeError regroups the bin by hash
+    class Fussy(Task):
+        def __lt__(self, other):
+            raise ValueError
 
-    hashmap.put("apple", 1)
-    hashmap.put("banana", 2)
-    hashmap["orange"] = 3
-    hashmap["banana"] = 10  # update
-
-    assert hashmap.get("apple") == 1
-    assert hashmap["banana"] == 10
-    assert hashmap.remove("orange") == 3
-    assert hashmap.remove("notfound") is None
-    assert "banana" in hashmap
-    del hashmap["banana"]
-    assert "banana" not in hashmap
-
-    for key, value in hashmap:
-        print(f"{key} => {value}")
+    for i in range(10):
+        hashmap[Fussy(f"fussy{i}", 0)] = i
+    assert len(hashmap) == 20 and all(hashmap.get(Fussy(f"fussy{i}", 0)) == i for i in range(10))
+    assert all(hashmap.get(task) == task.name for task in tasks[1::2])
 
     print("OK!")
\ No newline at end of file
@@ -1,92 +1,144 @@
-class HashNode:
-    def __init__(self, key=None, val=None, next=None):
-        self.key = key
-        self.val = val
-        self.next = next
-
-    def __str__(self):
-        return f"({self.key}: {self.val})"
-
-
-class LinkedHashMap:
-    def __init__(self, capacity=10):
-        self.capacity = capacity
-        self.buckets = [None] * self.capacity
-        self.size = 0
-        self.key_order = []  # maintains insertion order TODO implement double linked list
+from hashmap import HashMap, HashNode, TreeBin
 
-    def _hash(self, key):
-        return hash(key) % self.capacity
-
-    def put(self, key, value):
-        index = self._hash(key)
-        node = self.buckets[index]
-
-        if not node:
-            self.buckets[index] = HashNode(key, value)
-            self.key_order.append(key)
-            self.size += 1
-            return True
 
+class LinkedHashNode(HashNode):
+    def __init__(self, key=None, val=None, next=None):
+        super().__init__(key, val, next)
+        # neighbours in iteration order
+        self.before = None
+        self.after = None
+
+
+class LinkedHashMap(HashMap):
+    def __init__(self, capacity=10, load_factor=0.75, access_order=False, max_size=None, on_evict=None):
+        """
+        Initializes the hashmap with an array of buckets (linked lists).
+
+        Entries are also threaded on a circular doubly linked list around a
+        sentinel, in insertion order or, with `access_order`, from least to
+        most recently used. With `max_size` the eldest entry is evicted once
+        the map outgrows it and passed to `on_evict(key, val)`, which makes
+        the map a bounded LRU cache.
+        """
+        super().__init__(capacity=capacity, load_factor=load_factor)
+        if max_size is not None and max_size < 1:
+            raise ValueError("Max size must be positive")
+
+        self.access_order = access_order
+        self.max_size = max_size
+        self.on_evict = on_evict
+        self._head = LinkedHashNode()
+        self._head.before = self._head.after = self._head
+
+    def _link_last(self, node):
+        """
+        Appends the node to the order list; O(1)
+        """
+        last = self._head.before
+        node.before = last
+        node.after = self._head
+        last.after = node
+        self._head.before = node
+
+    @staticmethod
+    def _unlink(node):
+        """
+        Removes the node from the order list; O(1)
+        """
+        node.before.after = node.after
+        node.after.before = node.before
+        node.before = node.after = None
+
+    def _move_to_end(self, node):
+        if self._head.before is not node:
+            self._unlink(node)
+            self._link_last(node)
+
+    def _put(self, key, value):
+        buckets, index = self._locate(key)
+        head = buckets[index]
+        tree_bin = head if type(head) is TreeBin else None
+
+        node = tree_bin.find(key) if tree_bin else head
+        length = 0
         while node:
             if node.key == key:
                 node.val = value
-                return True
-            if not node.next:
-                break
+                if self.access_order:
+                    self._move_to_end(node)
+                return False
             node = node.next
-
-        node.next = HashNode(key, value)
-        self.key_order.append(key)
-        self.size += 1
+            length += 1
+
+        if tree_bin:
+            node = LinkedHashNode(key, value)
+            tree_bin.add(node)
+        else:
+            node = LinkedHashNode(key, value, head)
+            buckets[index] = node
+            if length + 1 >= self.TREEIFY_THRESHOLD:
+                buckets[index] = TreeBin(node)
+        self._link_last(node)
         return True
 
-    def get(self, key):
-        index = self._hash(key)
-        node = self.buckets[index]
-        while node:
-            if node.key == key:
-                return node.val
-            node = node.next
-        return None
-
-    def remove(self, key):
-        index = self._hash(key)
-        node = self.buckets[index]
-        prev = None
-
-        while node:
-            if node.key == key:
-                if prev:
-                    prev.next = node.next
-                else:
-                    self.buckets[index] = node.next
-                self.size -= 1
-                if key in self.key_order:
-                    self.key_order.remove(key)
-                return node.val
-            prev = node
-            node = node.next
-        return None
-
-    def __getitem__(self, key):
-        return self.get(key)
+    def _remove(self, key):
+        node = super()._remove(key)
+        if node:
+            self._unlink(node)
+        return node
 
-    def __setitem__(self, key, val):
-        self.put(key, val)
+    def put(self, key, value):
+        """
+        Inserts or updates a key-value pair, evicting the eldest entry past `max_size`.
+        Time: O(1) average.
+        """
+        super().put(key, value)
+        if self.max_size is not None and self.size > self.max_size:
+            self.evict()
+        return True
 
-    def __delitem__(self, key):
-        self.remove(key)
+    def get(self, key):
+        """
+        Retrieves value by key, marking it most recently used in access order.
+        Returns None if not found.
+        Time: O(1) average.
+        """
+        node = self._find(key)
+        self._maintain()
+        if not node:
+            return None
+        if self.access_order:
+            self._move_to_end(node)
+        return node.val
+
+    def evict(self):
+        """
+        Removes the eldest entry and reports it to `on_evict`.
+        Returns `(key, val)` or None if the map is empty; O(1) average.
+        """
+        eldest = self._head.after
+        if eldest is self._head:
+            return None
+
+        self.remove(eldest.key)
+        if self.on_evict is not None:
+            self.on_evict(eldest.key, eldest.val)
+        return (eldest.key, eldest.val)
+
+    def _settings(self):
+        # pickled with the snapshot: `on_evict` has to be a module-level function
+        return {"access_order": self.access_order, "max_size": self.max_size, "on_evict": self.on_evict}
 
     def __contains__(self, key):
-        return self.get(key) is not None
-
-    def __len__(self):
-        return self.size
+        # a membership test doesn't count as an access
+        node = self._find(key)
+        return node is not None and node.val is not None
 
     def __iter__(self):
-        for key in self.key_order:
-            yield (key, self.get(key))
+        node = self._head.after
+        while node is not self._head:
+            yield (node.key, node.val)
+            node = node.after
 
 
 if __name__ == "__main__":
@@ -110,5 +162,41 @@ if __name__ == "__main__":
     print("Key order:")
     for key, value in hashmap:
         print(f"{key} => {value}")
-
-    print("OK!")
\ No newline at end of file
+    assert [key for key, _ in hashmap] == ["apple", "banana2", "banana4", "banana3"]
+
+    for i in range(1000):
+        hashmap[i] = i
+    assert [key for key, _ in hashmap][4:] == list(range(1000))
+
+    evicted = []
+    cache = LinkedHashMap(access_order=True, max_size=3, on_evict=lambda key, val: evicted.append(key))
+    cache["a"] = 1
+    cache["b"] = 2
+    cache["c"] = 3
+    assert cache["a"] == 1
+    cache["d"] = 4
+    assert evicted == ["b"]
+    cache["c"] = 30
+    cache["e"] = 5
+    assert evicted == ["b", "a"]
+    assert [key for key, _ in cache] == ["d", "c", "e"]
+    assert len(cache) == 3
+
+    # a snapshot keeps the order and the LRU settings
+    import io
+
+    cache = LinkedHashMap(access_order=True, max_size=3, on_evict=print)
+    for key in "abc":
+        cache[key] = key
+    cache.get("a")
+    buffer = io.BytesIO()
+    cache.dump(buffer)
+    buffer.seek(0)
+    loaded = LinkedHashMap.load(buffer)
+    assert loaded.access_order and loaded.max_size == 3 and loaded.on_evict is print
+    assert [key for key, _ in loaded] == ["b", "c", "a"]
+    loaded.on_evict = None
+    loaded["d"] = "d"
+    assert [key for key, _ in loaded] == ["c", "a", "d"]
+
+    print("OK!")
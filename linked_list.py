@@ -78,6 +78,8 @@ class LinkedList:
             i += 1
 
         val = node.next.val
+        if node.next is self.tail:
+            self.tail = node
         node.next = node.next.next
         self.n -= 1
         return val
@@ -94,6 +96,353 @@ class LinkedList:
     def __len__(self):
         return self.n
 
+class DoublyLinkedNode:
+    __slots__ = ("val", "prev", "next")
+
+    def __init__(self, val = None, prev = None, next = None):
+        self.val = val
+        self.prev = prev
+        self.next = next
+
+    def __str__(self):
+        return str(self.val)
+
+class DoublyLinkedList:
+    def __init__(self):
+        """
+        Circular doubly linked list around a sentinel: `head.next` is the first
+        node and `head.prev` the last, so there are no empty-list special cases.
+        Inserting and removing at either end or at a node handle is O(1).
+        """
+        self.head = DoublyLinkedNode()
+        self.head.prev = self.head.next = self.head
+        self.n = 0
+
+    def _link(self, val, prev):
+        """
+        Links a new node after `prev` and returns it; O(1)
+        """
+        node = DoublyLinkedNode(val, prev, prev.next)
+        prev.next.prev = node
+        prev.next = node
+        self.n += 1
+        return node
+
+    def _node_at(self, index):
+        """
+        Walks from the closer end; O(min(index, n - index))
+        """
+        if index < self.n // 2:
+            node = self.head.next
+            for _ in range(index):
+                node = node.next
+        else:
+            node = self.head.prev
+            for _ in range(self.n - 1 - index):
+                node = node.prev
+        return node
+
+    def get(self, index = None):
+        """
+        Gets `val` from the linked list. If `index` is None, gets the last one with O(1).
+        """
+        if index is None:
+            index = self.n - 1
+        if not 0 <= index < self.n:
+            return None
+        return self._node_at(index).val
+
+    def put(self, val, index = None) -> bool:
+        """
+        Inserts `val` into the linked list. If `index` is None, appends with O(1),
+        otherwise inserts before the node at `index`.
+        """
+        if index is None:
+            self.append(val)
+            return True
+        if not 0 <= index < self.n:
+            return False
+        self._link(val, self._node_at(index).prev)
+        return True
+
+    def append(self, val):
+        """
+        Appends `val` and returns its node; O(1)
+        """
+        return self._link(val, self.head.prev)
+
+    def appendleft(self, val):
+        """
+        Prepends `val` and returns its node; O(1)
+        """
+        return self._link(val, self.head)
+
+    def insert_after(self, node, val):
+        return self._link(val, node)
+
+    def insert_before(self, node, val):
+        return self._link(val, node.prev)
+
+    def remove_node(self, node):
+        """
+        Unlinks a node of this list and returns its `val`; O(1)
+        """
+        if node.prev is None or node is self.head:
+            raise ValueError("Node is not linked")
+        node.prev.next = node.next
+        node.next.prev = node.prev
+        node.prev = node.next = None
+        self.n -= 1
+        return node.val
+
+    def pop(self, index = None):
+        """
+        Pops `val` from the linked list, the last one with O(1).
+        """
+        if index is None:
+            index = self.n - 1
+        if not 0 <= index < self.n:
+            return None
+        return self.remove_node(self._node_at(index))
+
+    def popleft(self):
+        """
+        Pops the first `val`; O(1)
+        """
+        if not self.n:
+            return None
+        return self.remove_node(self.head.next)
+
+    def cursor(self, index = 0):
+        """
+        Returns a cursor at `index`, past the end if the list is shorter.
+        """
+        return Cursor(self, self._node_at(index) if 0 <= index < self.n else self.head)
+
+    def __iter__(self):
+        node = self.head.next
+        while node is not self.head:
+            yield node.val
+            node = node.next
+
+    def __reversed__(self):
+        node = self.head.prev
+        while node is not self.head:
+            yield node.val
+            node = node.prev
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __len__(self):
+        return self.n
+
+class Cursor:
+    """
+    Position in a DoublyLinkedList that survives edits around it. Past either
+    end it sits on the sentinel and `valid` is False.
+
+        cursor = linked_list.cursor()
+        while cursor.valid:
+            if cursor.val % 2:
+                cursor.delete()
+            else:
+                cursor.move_next()
+    """
+
+    def __init__(self, linked_list, node):
+        self.list = linked_list
+        self.node = node
+
+    @property
+    def valid(self):
+        return self.node is not self.list.head
+
+    @property
+    def val(self):
+        if not self.valid:
+            raise IndexError("Cursor is past the end")
+        return self.node.val
+
+    def move_next(self):
+        self.node = self.node.next
+        return self.valid
+
+    def move_prev(self):
+        self.node = self.node.prev
+        return self.valid
+
+    def insert_before(self, val):
+        """
+        Inserts before the current position (at the end if past it); O(1)
+        """
+        return self.list.insert_before(self.node, val)
+
+    def insert_after(self, val):
+        """
+        Inserts after the current position (at the front if past the end); O(1)
+        """
+        return self.list.insert_after(self.node, val)
+
+    def delete(self):
+        """
+        Removes the current node, moves to the next one and returns the removed `val`; O(1)
+        """
+        if not self.valid:
+            raise IndexError("Cursor is past the end")
+        node = self.node
+        self.node = node.next
+        return self.list.remove_node(node)
+
+class UnrolledLinkedList:
+    def __init__(self, chunk_size = 64):
+        """
+        Sequence stored as chunks of up to `2 * chunk_size` values, each chunk a
+        plain list, so a value costs one pointer instead of one node object.
+
+        A Fenwick tree over the chunk lengths (`_tree`, 1-based) finds the chunk
+        of a position in O(log C). Appends fill the last chunk and open a new one
+        once it holds `chunk_size` values; inserts split a chunk past twice that.
+        """
+        if chunk_size < 2:
+            raise ValueError("Chunk size must be at least 2")
+
+        self.chunk_size = chunk_size
+        self._chunks = []
+        self._tree = [0]
+        self.n = 0
+
+    def _rebuild(self):
+        """
+        Rebuilds the Fenwick tree after chunks were split, merged or removed; O(C)
+        """
+        tree = [0] + [len(chunk) for chunk in self._chunks]
+        for i in range(1, len(tree)):
+            j = i + (i & -i)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _prefix(self, i):
+        """
+        Number of values in the first `i` chunks; O(log C)
+        """
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _add(self, chunk_idx, delta):
+        i = chunk_idx + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _append_chunk(self, chunk):
+        # the new tree slot covers chunks (i - lowbit(i), i]; O(log C)
+        self._chunks.append(chunk)
+        i = len(self._chunks)
+        self._tree.append(len(chunk) + self._prefix(i - 1) - self._prefix(i - (i & -i)))
+
+    def _locate(self, index):
+        """
+        Returns `(chunk index, offset)` of a valid position; O(log C)
+        """
+        last = self._chunks[-1]
+        if index >= self.n - len(last):
+            return len(self._chunks) - 1, index - (self.n - len(last))
+
+        tree = self._tree
+        pos = 0
+        step = 1 << (len(tree) - 1).bit_length() - 1
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= index:
+                pos = nxt
+                index -= tree[nxt]
+            step >>= 1
+        return pos, index
+
+    def get(self, index = None):
+        """
+        Gets `val` from the linked list, the last one if `index` is None; O(log C)
+        """
+        if index is None:
+            index = self.n - 1
+        if not 0 <= index < self.n:
+            return None
+        chunk_idx, offset = self._locate(index)
+        return self._chunks[chunk_idx][offset]
+
+    def put(self, val, index = None) -> bool:
+        """
+        Inserts `val` into the linked list. If `index` is None, appends with O(1)
+        amortized, otherwise inserts before `index` with O(log C + chunk_size).
+        """
+        if index is None:
+            if self._chunks and len(self._chunks[-1]) < self.chunk_size:
+                self._chunks[-1].append(val)
+                self._add(len(self._chunks) - 1, 1)
+            else:
+                self._append_chunk([val])
+            self.n += 1
+            return True
+
+        if not 0 <= index < self.n:
+            return False
+
+        chunk_idx, offset = self._locate(index)
+        chunk = self._chunks[chunk_idx]
+        chunk.insert(offset, val)
+        self.n += 1
+        if len(chunk) > 2 * self.chunk_size:
+            self._chunks[chunk_idx + 1:chunk_idx + 1] = [chunk[self.chunk_size:]]
+            del chunk[self.chunk_size:]
+            self._rebuild()
+        else:
+            self._add(chunk_idx, 1)
+        return True
+
+    def pop(self, index = None):
+        """
+        Pops `val` from the linked list, the last one with O(1) amortized.
+        """
+        if index is None:
+            index = self.n - 1
+        if not 0 <= index < self.n:
+            return None
+
+        chunk_idx, offset = self._locate(index)
+        chunk = self._chunks[chunk_idx]
+        val = chunk.pop(offset)
+        self.n -= 1
+
+        if chunk_idx == len(self._chunks) - 1 and not chunk:
+            # dropping the last slot leaves the rest of the tree valid
+            self._chunks.pop()
+            self._tree.pop()
+        elif chunk_idx + 1 < len(self._chunks) and len(chunk) + len(self._chunks[chunk_idx + 1]) <= self.chunk_size:
+            chunk.extend(self._chunks.pop(chunk_idx + 1))
+            self._rebuild()
+        elif not chunk:
+            del self._chunks[chunk_idx]
+            self._rebuild()
+        else:
+            self._add(chunk_idx, -1)
+        return val
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __len__(self):
+        return self.n
+
 if __name__ == "__main__":
     linked_list = LinkedList()
 
@@ -113,4 +462,51 @@ if __name__ == "__main__":
     print()
     assert list(linked_list) == [0, 100, 2]
 
+    linked_list = DoublyLinkedList()
+    for i in range(5):
+        linked_list.put(i)
+
+    assert linked_list.get(4) == 4
+    assert linked_list[0] == 0
+    linked_list.put(val=100, index=2)
+    assert linked_list[2] == 100
+    assert linked_list.pop() == 4
+    assert linked_list.pop() == 3
+    assert linked_list.pop(1) == 1
+    assert list(linked_list) == [0, 100, 2]
+
+    node = linked_list.appendleft(-1)
+    linked_list.append(3)
+    assert linked_list.popleft() == -1 and linked_list.popleft() == 0
+    node = linked_list.append(4)
+    linked_list.insert_before(node, 3.5)
+    assert linked_list.remove_node(node) == 4
+    assert list(linked_list) == [100, 2, 3, 3.5] and list(reversed(linked_list)) == [3.5, 3, 2, 100]
+
+    cursor = linked_list.cursor()
+    while cursor.valid:
+        if cursor.val == 2:
+            cursor.insert_before(1)
+            cursor.delete()
+        else:
+            cursor.insert_after(cursor.val * 10)
+            cursor.move_next()
+            cursor.move_next()
+    assert list(linked_list) == [100, 1000, 1, 3, 30, 3.5, 35.0]
+    assert len(linked_list) == 7 and linked_list.pop(5) == 3.5
+
+    linked_list = UnrolledLinkedList(chunk_size=4)
+    expected = []
+    for i in range(50):
+        linked_list.put(i)
+        expected.append(i)
+    for i in range(0, 40, 3):
+        linked_list.put(val=-i, index=i)
+        expected.insert(i, -i)
+    assert list(linked_list) == expected and len(linked_list) == len(expected)
+    assert all(linked_list[i] == expected[i] for i in range(len(expected)))
+    for i in (0, 10, 30, None, None, 5):
+        assert linked_list.pop(i) == expected.pop(-1 if i is None else i)
+    assert list(linked_list) == expected and linked_list.get(len(expected)) is None
+
     print("OK!")
\ No newline at end of file
@@ -1,46 +1,148 @@
+import itertools
+
+import instrumentation
+import snapshot
+from blocking import AsyncBuffer, BlockingBuffer
+
+
 class MinHeap:
-    def __init__(self):
-        self._buffer = []
+    # set on instances switched over by `enable_stats`
+    _stats = None
+
+    def __init__(self, items=(), arity=2):
+        """
+        Array-backed d-ary min-heap; children of `i` are `arity * i + 1 ... arity * i + arity`.
+        A wider heap is shallower and keeps the children of a node next to each
+        other, at the price of more comparisons per level on the way down.
+        """
+        if arity < 2:
+            raise ValueError("Arity must be at least 2")
+
+        self.arity = arity
+        self._buffer = list(items)
+        self.heapify()
 
     def push(self, item):
         """Insert a tuple into the heap; O(log n)"""
         self._buffer.append(item)
         self._sift_up(len(self._buffer) - 1)
 
+    def push_many(self, items):
+        """Insert many tuples; O(n + k) heapify for a large batch, O(k log n) otherwise"""
+        start = len(self._buffer)
+        self._buffer.extend(items)
+        added = len(self._buffer) - start
+        if added > start:
+            self.heapify()
+        else:
+            for i in range(start, len(self._buffer)):
+                self._sift_up(i)
+
     def pop(self):
         """Remove and return the smallest tuple; O(log n)"""
         if not self._buffer:
             raise IndexError("pop from empty heap")
 
-        self._swap(0, len(self._buffer) - 1)
-        smallest = self._buffer.pop()
+        last = self._buffer.pop()
+        if not self._buffer:
+            return last
+
+        smallest = self._buffer[0]
+        self._buffer[0] = last
         self._sift_down(0)
         return smallest
 
+    def peek(self):
+        """Return the smallest tuple without removing it; O(1)"""
+        if not self._buffer:
+            raise IndexError("peek from empty heap")
+        return self._buffer[0]
+
+    def heapify(self):
+        """Restore the heap property over the whole buffer; O(n)"""
+        for idx in range((len(self._buffer) - 2) // self.arity, -1, -1):
+            self._sift_down(idx)
+
+    def dump(self, fp):
+        """Write the buffer as-is to the binary file `fp`; O(n)"""
+        snapshot.dump(fp, "MinHeap", {"arity": self.arity}, len(self._buffer), self._buffer)
+
+    @classmethod
+    def load(cls, fp):
+        """Rebuild a heap written by `dump`; O(n), no sifting"""
+        meta, _, entries = snapshot.load(fp, "MinHeap")
+        heap = cls(arity=meta["arity"])
+        heap._restore(entries)
+        return heap
+
+    def _restore(self, entries):
+        """Adopt items already in heap order, e.g. a dumped buffer"""
+        self._buffer.extend(entries)
+
     def _sift_up(self, idx):
-        """Restore the heap property; O(log n)"""
-        parent = (idx - 1) // 2
-        if idx > 0 and self._buffer[idx] < self._buffer[parent]:
-            self._swap(idx, parent)
-            self._sift_up(parent)
+        """Move the item at `idx` up through a hole, one write per level, return its new index; O(log n)"""
+        buffer = self._buffer
+        item = buffer[idx]
+        while idx > 0:
+            parent = (idx - 1) // self.arity
+            if not item < buffer[parent]:
+                break
+            buffer[idx] = buffer[parent]
+            idx = parent
+        buffer[idx] = item
+        return idx
 
     def _sift_down(self, idx):
-        """Restore the heap property; O(log n)"""
-        smallest = idx
-        left = 2 * idx + 1
-        right = 2 * idx + 2
+        """Move the item at `idx` down through a hole, one write per level, return its new index; O(d log n)"""
+        buffer = self._buffer
+        size = len(buffer)
+        arity = self.arity
+        item = buffer[idx]
+
+        while True:
+            child = arity * idx + 1
+            if child >= size:
+                break
+
+            if arity == 2:
+                smallest = buffer[child]
+                if child + 1 < size and buffer[child + 1] < smallest:
+                    child += 1
+                    smallest = buffer[child]
+            else:
+                smallest = buffer[child]
+                for j in range(child + 1, min(child + arity, size)):
+                    if buffer[j] < smallest:
+                        child, smallest = j, buffer[j]
+
+            if not smallest < item:
+                break
+            buffer[idx] = smallest
+            idx = child
+        buffer[idx] = item
+        return idx
 
-        if left < len(self._buffer) and self._buffer[left] < self._buffer[smallest]:
-            smallest = left
-        if right < len(self._buffer) and self._buffer[right] < self._buffer[smallest]:
-            smallest = right
+    def enable_stats(self, callback=None):
+        """
+        Start recording how many levels each sift moves an item, see `stats`.
+        The heap stays a bit slower after `disable_stats`, see `instrumentation`.
+        """
+        instrumentation.enable(self, _MinHeapStats, callback)
 
-        if smallest != idx:
-            self._swap(idx, smallest)
-            self._sift_down(smallest)
+    def disable_stats(self):
+        instrumentation.disable(self)
 
-    def _swap(self, i, j):
-        self._buffer[i], self._buffer[j] = self._buffer[j], self._buffer[i]
+    def stats(self):
+        """Return the size and depth, plus sift depth histograms while stats are enabled; O(log n)"""
+        depth = 0
+        idx = len(self._buffer) - 1
+        while idx > 0:
+            idx = (idx - 1) // self.arity
+            depth += 1
+        result = {"size": len(self._buffer), "depth": depth}
+        if self._stats is not None:
+            result.update(self._stats.snapshot())
+        return result
 
     def __len__(self):
         return len(self._buffer)
@@ -49,9 +151,152 @@ class MinHeap:
         for val in self._buffer:
             yield val
 
+class _MinHeapStats:
+    """Instrumented overrides put in front of a heap's class by `enable_stats`"""
+
+    def _levels(self, ancestor, idx):
+        levels = 0
+        while idx > ancestor:
+            idx = (idx - 1) // self.arity
+            levels += 1
+        return levels
+
+    def _sift_up(self, idx):
+        end = super()._sift_up(idx)
+        self._stats.observe("sift_up_depth", self._levels(end, idx))
+        return end
+
+    def _sift_down(self, idx):
+        end = super()._sift_down(idx)
+        self._stats.observe("sift_down_depth", self._levels(idx, end))
+        return end
+
+class IndexedMinHeap(MinHeap):
+    def __init__(self, items=(), arity=2):
+        """
+        Min-heap of tuples ending with a unique, hashable handle. Every move of
+        an item updates `_positions`, so an item can be found, re-prioritized
+        or removed by its handle.
+        """
+        self._positions = {}
+        super().__init__(items, arity)
+
+    def _restore(self, entries):
+        super()._restore(entries)
+        self._positions = {item[-1]: idx for idx, item in enumerate(self._buffer)}
+
+    def heapify(self):
+        """Restore the heap property and rebuild the position index; O(n)"""
+        self._positions = {item[-1]: idx for idx, item in enumerate(self._buffer)}
+        if len(self._positions) != len(self._buffer):
+            raise ValueError("Handles must be unique")
+        super().heapify()
+
+    def push(self, item):
+        """Insert a tuple with a new handle; O(log n)"""
+        if item[-1] in self._positions:
+            raise ValueError("Handle is already in the heap")
+        self._buffer.append(item)
+        self._positions[item[-1]] = len(self._buffer) - 1
+        self._sift_up(len(self._buffer) - 1)
+
+    def push_many(self, items):
+        """Insert many tuples with new handles"""
+        items = list(items)
+        handles = {item[-1] for item in items}
+        if len(handles) != len(items) or any(handle in self._positions for handle in handles):
+            raise ValueError("Handle is already in the heap")
+        if len(items) > len(self._buffer):
+            self._buffer.extend(items)
+            self.heapify()
+        else:
+            for item in items:
+                self.push(item)
+
+    def pop(self):
+        """Remove and return the smallest tuple; O(log n)"""
+        smallest = super().pop()
+        del self._positions[smallest[-1]]
+        return smallest
+
+    def get(self, handle):
+        """Return the tuple of a handle or None; O(1)"""
+        idx = self._positions.get(handle)
+        return None if idx is None else self._buffer[idx]
+
+    def replace(self, item):
+        """Replace the tuple with the same handle and restore its position; O(log n)"""
+        idx = self._positions[item[-1]]
+        old = self._buffer[idx]
+        self._buffer[idx] = item
+        if item < old:
+            self._sift_up(idx)
+        else:
+            self._sift_down(idx)
+
+    def remove(self, handle):
+        """Remove and return the tuple of a handle, or None; O(log n)"""
+        idx = self._positions.pop(handle, None)
+        if idx is None:
+            return None
+
+        item = self._buffer[idx]
+        last = self._buffer.pop()
+        if idx < len(self._buffer):
+            self._buffer[idx] = last
+            self._positions[last[-1]] = idx
+            if last < item:
+                self._sift_up(idx)
+            else:
+                self._sift_down(idx)
+        return item
+
+    def _sift_up(self, idx):
+        buffer = self._buffer
+        positions = self._positions
+        item = buffer[idx]
+        while idx > 0:
+            parent = (idx - 1) // self.arity
+            if not item < buffer[parent]:
+                break
+            buffer[idx] = buffer[parent]
+            positions[buffer[idx][-1]] = idx
+            idx = parent
+        buffer[idx] = item
+        positions[item[-1]] = idx
+        return idx
+
+    def _sift_down(self, idx):
+        buffer = self._buffer
+        positions = self._positions
+        size = len(buffer)
+        arity = self.arity
+        item = buffer[idx]
+
+        while True:
+            child = arity * idx + 1
+            if child >= size:
+                break
+
+            smallest = buffer[child]
+            for j in range(child + 1, min(child + arity, size)):
+                if buffer[j] < smallest:
+                    child, smallest = j, buffer[j]
+
+            if not smallest < item:
+                break
+            buffer[idx] = smallest
+            positions[smallest[-1]] = idx
+            idx = child
+        buffer[idx] = item
+        positions[item[-1]] = idx
+        return idx
+
 class PriorityQueue:
-    def __init__(self):
-        self.heap = MinHeap()
+    def __init__(self, arity=2):
+        self.heap = MinHeap(arity=arity)
+        # breaks priority ties in FIFO order, so values are never compared
+        self._counter = itertools.count()
 
     def push(self, val, priority=None):
         """Puts the value with the priority to the buffer; O(log n)"""
@@ -62,21 +307,153 @@ class PriorityQueue:
             # Use default priority for
             priority = -1
 
-        self.heap.push((priority, val))
+        self.heap.push((priority, next(self._counter), val))
+
+    def push_many(self, items):
+        """Puts `(val, priority)` pairs to the buffer; O(n + k) for a large batch"""
+        entries = []
+        for val, priority in items:
+            if priority is not None and priority < 0:
+                raise ValueError("Priority can't be bellow zero")
+            entries.append((-1 if priority is None else priority, next(self._counter), val))
+        self.heap.push_many(entries)
 
     def pop(self):
         """Returns the value with the lowest priority from the buffer; O(log n)"""
 
-        _, val = self.heap.pop()
+        _, _, val = self.heap.pop()
         return val
 
+    def peek(self):
+        """Returns the value with the lowest priority without removing it; O(1)"""
+        return self.heap.peek()[-1]
+
+    def pop_many(self, k):
+        """Pops up to `k` values in priority order; O(k log n)"""
+        return [self.pop() for _ in range(min(k, len(self.heap)))]
+
+    def dump(self, fp):
+        """Writes the heap buffer as-is to the binary file `fp`; O(n)"""
+        # skipping a sequence number is harmless, ties only need increasing ones
+        meta = {"arity": self.heap.arity, "counter": next(self._counter)}
+        snapshot.dump(fp, "PriorityQueue", meta, len(self.heap), self.heap._buffer)
+
+    @classmethod
+    def load(cls, fp):
+        """Rebuilds a queue written by `dump`, keeping the FIFO order of ties; O(n)"""
+        meta, _, entries = snapshot.load(fp, "PriorityQueue")
+        queue = cls(arity=meta["arity"])
+        queue._counter = itertools.count(meta["counter"])
+        queue.heap._restore(entries)
+        return queue
+
     def __iter__(self):
-        for priority, val in self.heap:
+        for priority, _, val in self.heap:
             yield val
 
     def __len__(self):
         return len(self.heap)
 
+class IndexedPriorityQueue(PriorityQueue):
+    def __init__(self, arity=2):
+        """
+        Priority queue addressable by value: every value is its own handle, so
+        values must be hashable and are queued at most once. Priorities can be
+        changed and values removed in O(log n) instead of pushing duplicates.
+        """
+        self.heap = IndexedMinHeap(arity=arity)
+        self._counter = itertools.count()
+
+    def push(self, val, priority=None):
+        """Queues the value, or changes its priority if already queued; O(log n)"""
+        if val in self:
+            self.update_priority(val, priority)
+        else:
+            super().push(val, priority)
+
+    def push_many(self, items):
+        """Queues `(val, priority)` pairs like `push` does; O(n + k) for a large batch"""
+        entries = {}
+        for val, priority in items:
+            if priority is not None and priority < 0:
+                raise ValueError("Priority can't be bellow zero")
+            if val in self:
+                self.update_priority(val, priority)
+            else:
+                # a value repeated in the batch keeps its last priority
+                entries[val] = (-1 if priority is None else priority, next(self._counter), val)
+        self.heap.push_many(entries.values())
+
+    def update_priority(self, val, priority=None):
+        """Changes the priority of a queued value, KeyError if missing; O(log n)"""
+        if priority is not None and priority < 0:
+            raise ValueError("Priority can't be bellow zero")
+        if val not in self:
+            raise KeyError(val)
+
+        # a changed priority counts as a fresh arrival among ties
+        self.heap.replace((-1 if priority is None else priority, next(self._counter), val))
+
+    def priority(self, val):
+        """Returns the priority of a queued value or None; O(1)"""
+        entry = self.heap.get(val)
+        return None if entry is None else entry[0]
+
+    def remove(self, val):
+        """Removes a queued value, returns True if it was queued; O(log n)"""
+        return self.heap.remove(val) is not None
+
+    def contains(self, val):
+        """O(1)"""
+        return val in self.heap._positions
+
+    def __contains__(self, val):
+        return self.contains(val)
+
+class BlockingPriorityQueue(BlockingBuffer):
+    """
+    Thread-safe PriorityQueue: `push(val, priority)` and `pop()` block with
+    optional timeouts, `maxsize` bounds the queue and `get_many` drains a batch
+    in priority order.
+    """
+
+    def __init__(self, maxsize=0, arity=2):
+        super().__init__(maxsize)
+        self._buffer = PriorityQueue(arity=arity)
+
+    def _put(self, val, priority=None):
+        self._buffer.push(val, priority)
+
+    def _get(self):
+        return self._buffer.pop()
+
+    def push(self, val, priority=None, block=True, timeout=None):
+        """Puts the value with the priority, waiting for a free slot like `put`"""
+        self.put(val, priority, block=block, timeout=timeout)
+
+    pop = BlockingBuffer.get
+
+class AsyncPriorityQueue(AsyncBuffer):
+    """
+    asyncio PriorityQueue: `await push(val, priority)`, `await pop()`, `await get_many(n)`.
+    """
+
+    def __init__(self, maxsize=0, arity=2):
+        super().__init__(maxsize)
+        self._buffer = PriorityQueue(arity=arity)
+
+    def _put(self, val, priority=None):
+        self._buffer.push(val, priority)
+
+    def _get(self):
+        return self._buffer.pop()
+
+    async def push(self, val, priority=None, timeout=None):
+        """Puts the value with the priority, waiting for a free slot like `put`"""
+        await self.put(val, priority, timeout=timeout)
+
+    pop = AsyncBuffer.get
+
 if __name__ == "__main__":
     priority_queue = PriorityQueue()
 
@@ -87,4 +464,102 @@ if __name__ == "__main__":
     assert len(priority_queue) == 2
     assert list(priority_queue) == [3, 1]
 
+    # ties come out in insertion order and payloads are never compared
+    priority_queue = PriorityQueue(arity=4)
+    priority_queue.push_many([({"a": 1}, 1), ({"b": 2}, 1), ({"c": 3}, 0)])
+    assert [priority_queue.pop() for _ in range(3)] == [{"c": 3}, {"a": 1}, {"b": 2}]
+
+    indexed = IndexedPriorityQueue()
+    for val, priority in (("a", 5), ("b", 3), ("c", 8), ("d", 1)):
+        indexed.push(val, priority)
+    indexed.update_priority("c", 0)
+    indexed.push("a", 2)  # decrease-key
+    assert indexed.remove("d") and not indexed.remove("d")
+    assert "b" in indexed and "d" not in indexed and indexed.priority("a") == 2
+    assert indexed.peek() == "c" and len(indexed) == 3
+    assert indexed.pop_many(2) == ["c", "a"] and indexed.pop_many(5) == ["b"]
+
+    import asyncio
+    import threading
+    from blocking import Full
+
+    blocking = BlockingPriorityQueue(maxsize=10)
+    popped = []
+    consumer = threading.Thread(target=lambda: popped.extend(blocking.pop(timeout=1) for _ in range(3)))
+    consumer.start()
+    blocking.push("low", 9)
+    blocking.push("high", 1)
+    blocking.push("mid", 5)
+    consumer.join()
+    assert sorted(popped) == ["high", "low", "mid"]
+    for val, priority in (("c", 3), ("a", 1), ("b", 2)):
+        blocking.push(val, priority=priority)
+    assert blocking.get_many(10) == ["a", "b", "c"]
+    blocking = BlockingPriorityQueue(maxsize=1)
+    blocking.push("x", priority=1, block=False)
+    try:
+        blocking.push("y", priority=2, timeout=0.01)
+        assert False
+    except Full:
+        pass
+
+    async def drain():
+        queue = AsyncPriorityQueue()
+        await queue.push("b", 2)
+        await queue.push("a", priority=1)
+        return [await queue.pop(), await queue.pop()]
+
+    assert asyncio.run(drain()) == ["a", "b"]
+
+    import random
+    items = [random.random() for _ in range(1000)]
+    for arity in (2, 3, 4, 8):
+        heap = MinHeap(items[:500], arity=arity)
+        heap.push_many(items[500:600])
+        for item in items[600:]:
+            heap.push(item)
+        assert heap.peek() == min(items)
+        assert [heap.pop() for _ in range(len(items))] == sorted(items)
+
+        indexed = IndexedPriorityQueue(arity=arity)
+        indexed.push_many((i, items[i]) for i in range(500))
+        for i in range(500, 1000):
+            indexed.push(i, items[i])
+        expected = {i: items[i] for i in range(1000)}
+        for i in random.sample(range(1000), 300):
+            expected[i] = random.random()
+            indexed.update_priority(i, expected[i])
+        # queued values and repeats within a batch are re-prioritized, as by `push`
+        batch = [(i, random.random()) for i in random.sample(range(1000), 100) * 2]
+        indexed.push_many(batch)
+        expected.update(batch)
+        for i in random.sample(range(1000), 300):
+            indexed.remove(i)
+            del expected[i]
+        assert all(indexed.heap._buffer[idx][-1] == val for val, idx in indexed.heap._positions.items())
+        assert indexed.pop_many(1000) == sorted(expected, key=expected.get)
+
+    import io
+
+    buffer = io.BytesIO()
+    priority_queue = IndexedPriorityQueue(arity=3)
+    priority_queue.push_many((i, i % 7) for i in range(1000))
+    priority_queue.dump(buffer)
+    buffer.seek(0)
+    loaded = IndexedPriorityQueue.load(buffer)
+    assert loaded.heap._buffer == priority_queue.heap._buffer and loaded.heap.arity == 3
+    loaded.push(1000, 0)
+    assert 999 in loaded and loaded.pop_many(1001) == sorted(range(1001), key=lambda i: i % 7 if i < 1000 else 0)
+
+    heap = MinHeap(random.sample(range(1000), 1000))
+    buffer = io.BytesIO()
+    heap.dump(buffer)
+    buffer.seek(0)
+    loaded = MinHeap.load(buffer)
+    assert loaded._buffer == heap._buffer and loaded.pop() == 0
+
+    loaded.enable_stats()
+    loaded.push(-1)
+    assert loaded.stats()["histograms"]["sift_up_depth"] == {loaded.stats()["depth"]: 1}
+
     print("OK!")
@@ -1,6 +1,136 @@
 import linked_list
+from blocking import AsyncBuffer, BlockingBuffer
 
 class Queue:
+    MIN_CAPACITY = 8
+
+    def __init__(self, capacity=None, overwrite=False):
+        """
+        FIFO queue on a circular buffer: `_data[_head]` is the oldest item and
+        the `_size` items wrap around the end of the list.
+
+        Unbounded by default, the buffer doubles when full and halves when a
+        quarter full. With `capacity` it never grows: `put` on a full queue
+        returns False, or with `overwrite` drops the oldest item instead.
+        """
+        if capacity is not None and capacity < 1:
+            raise ValueError("Capacity must be positive")
+
+        self.capacity = capacity
+        self.overwrite = overwrite
+        self._data = [None] * (capacity or self.MIN_CAPACITY)
+        self._head = 0
+        self._size = 0
+
+    def put(self, val) -> bool:
+        """
+        Puts in the queue; O(1) amortized
+        """
+        data = self._data
+        if self._size == len(data):
+            if self.capacity is None:
+                self._resize(2 * len(data))
+                data = self._data
+            elif self.overwrite:
+                data[self._head] = val
+                self._head = (self._head + 1) % len(data)
+                return True
+            else:
+                return False
+
+        idx = self._head + self._size
+        if idx >= len(data):
+            idx -= len(data)
+        data[idx] = val
+        self._size += 1
+        return True
+
+    def get(self):
+        """
+        Gets from the queue, None if empty; O(1) amortized
+        """
+        if not self._size:
+            return None
+
+        data = self._data
+        val = data[self._head]
+        data[self._head] = None
+        self._head += 1
+        if self._head == len(data):
+            self._head = 0
+        self._size -= 1
+
+        if self.capacity is None and self._size * 4 <= len(data) > self.MIN_CAPACITY:
+            self._resize(len(data) // 2)
+        return val
+
+    def put_many(self, items):
+        """
+        Puts every item, copying them in with slices when unbounded; O(k) amortized.
+        Returns the number of items put.
+        """
+        if self.capacity is not None:
+            return sum(self.put(val) for val in items)
+
+        items = list(items)
+        if self._size + len(items) > len(self._data):
+            capacity = len(self._data)
+            while capacity < self._size + len(items):
+                capacity *= 2
+            self._resize(capacity)
+
+        data = self._data
+        start = (self._head + self._size) % len(data)
+        first = min(len(items), len(data) - start)
+        data[start:start + first] = items[:first]
+        data[:len(items) - first] = items[first:]
+        self._size += len(items)
+        return len(items)
+
+    def get_many(self, max_items):
+        """
+        Gets up to `max_items` oldest items with slices; O(k)
+        """
+        count = min(max_items, self._size)
+        data = self._data
+        end = self._head + count
+        if end <= len(data):
+            items = data[self._head:end]
+            data[self._head:end] = [None] * count
+        else:
+            end -= len(data)
+            items = data[self._head:] + data[:end]
+            data[self._head:] = [None] * (len(data) - self._head)
+            data[:end] = [None] * end
+
+        self._head = end % len(data)
+        self._size -= count
+        if self.capacity is None and self._size * 4 <= len(data) > self.MIN_CAPACITY:
+            capacity = len(data)
+            while self._size * 4 <= capacity > self.MIN_CAPACITY:
+                capacity //= 2
+            self._resize(capacity)
+        return items
+
+    def _resize(self, capacity):
+        """
+        Copies the items in order to the front of a new list; O(n)
+        """
+        data = self._data
+        end = self._head + self._size
+        items = data[self._head:end] + data[:max(0, end - len(data))]
+        self._data = items + [None] * (capacity - self._size)
+        self._head = 0
+
+    def __iter__(self):
+        data = self._data
+        for i in range(self._size):
+            yield data[(self._head + i) % len(data)]
+
+    def __len__(self):
+        return self._size
+
+class LinkedQueue:
     def __init__(self):
         self._buffer = linked_list.LinkedList()
 
@@ -10,7 +140,7 @@ class Queue:
         """
         self._buffer.put(val)
 
-        return False
+        return True
 
     def get(self):
         """
@@ -19,11 +149,42 @@ class Queue:
         return self._buffer.pop(index=0)
 
     def __iter__(self):
-        yield self._buffer
+        yield from self._buffer
 
     def __len__(self):
         return len(self._buffer)
 
+class BlockingQueue(BlockingBuffer):
+    """
+    Thread-safe FIFO queue with blocking/timeout `get`, optional `maxsize`
+    backpressure on `put` and batched `get_many`.
+    """
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self._buffer = Queue()
+
+    def _put(self, val):
+        self._buffer.put(val)
+
+    def _get(self):
+        return self._buffer.get()
+
+class AsyncQueue(AsyncBuffer):
+    """
+    asyncio FIFO queue: `await put(val)`, `await get()`, `await get_many(n)`.
+    """
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self._buffer = Queue()
+
+    def _put(self, val):
+        self._buffer.put(val)
+
+    def _get(self):
+        return self._buffer.get()
+
 if __name__ == "__main__":
     queue = Queue()
 
@@ -35,5 +196,84 @@ if __name__ == "__main__":
     assert queue.get() == 2
     assert len(queue) == 1
     assert queue.get() == 3
+    assert queue.get() is None
+
+    queue.put_many(range(20))
+    assert queue.get_many(5) == [0, 1, 2, 3, 4]
+    queue.put_many(range(20, 40))
+    assert list(queue) == list(range(5, 40)) and len(queue) == 35
+    assert [queue.get() for _ in range(30)] == list(range(5, 35))
+    queue.put(40)
+    assert queue.get_many(100) == [35, 36, 37, 38, 39, 40] and len(queue._data) == Queue.MIN_CAPACITY
+
+    ring = Queue(capacity=3, overwrite=True)
+    assert ring.put_many(range(5)) == 5 and list(ring) == [2, 3, 4]
+    bounded = Queue(capacity=2)
+    assert bounded.put(1) and bounded.put(2) and not bounded.put(3)
+    assert list(bounded) == [1, 2]
+
+    import asyncio
+    import threading
+    from blocking import Empty, Full
+
+    queue = BlockingQueue(maxsize=4)
+    received = []
+
+    def consume():
+        while True:
+            batch = queue.get_many(3, timeout=1)
+            if None in batch:
+                received.extend(batch[:batch.index(None)])
+                return
+            received.extend(batch)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    for i in range(1000):
+        queue.put(i)
+    queue.put(None)
+    consumer.join()
+    assert received == list(range(1000))
+
+    queue.put(1)
+    queue.put_nowait(2)
+    queue.put(3, timeout=0.01)
+    queue.put(4)
+    try:
+        queue.put(5, timeout=0.01)
+    except Full:
+        pass
+    else:
+        raise AssertionError("put on a full queue")
+    assert queue.get_many(10) == [1, 2, 3, 4]
+    try:
+        queue.get(timeout=0.01)
+    except Empty:
+        pass
+    else:
+        raise AssertionError("get from an empty queue")
+    assert queue.get_many(10, timeout=0.01) == []
+
+    async def pipeline():
+        queue = AsyncQueue(maxsize=2)
+
+        async def produce():
+            for i in range(100):
+                await queue.put(i)
+
+        producer = asyncio.create_task(produce())
+        received = []
+        while len(received) < 100:
+            received.extend(await queue.get_many(8))
+        await producer
+        assert received == list(range(100))
+        try:
+            await queue.get(timeout=0.01)
+        except Empty:
+            pass
+        else:
+            raise AssertionError("get from an empty queue")
+
+    asyncio.run(pipeline())
 
     print("OK!")
\ No newline at end of file
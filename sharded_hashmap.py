@@ -0,0 +1,249 @@
+import multiprocessing
+import operator
+import os
+
+from hashmap import HashMap
+
+# Fibonacci hashing: 2 ** 64 / golden ratio, spreads any bits of the hash to the high ones
+_MIX = 0x9E3779B97F4A7C15
+_MASK = 2 ** 64 - 1
+
+
+def _serve(conn):
+    """
+    Worker loop: owns one shard and answers batched commands until "close".
+    """
+    shard = HashMap()
+    while True:
+        op, args = conn.recv()
+        if op == "close":
+            conn.close()
+            return
+
+        try:
+            if op == "put_many":
+                for key, value in args:
+                    shard.put(key, value)
+                result = None
+            elif op == "get_many":
+                result = [shard.get(key) for key in args]
+            elif op == "remove_many":
+                result = [shard.remove(key) for key in args]
+            elif op == "aggregate":
+                items, fn = args
+                for key, value in items:
+                    old = shard.get(key)
+                    shard.put(key, value if old is None else fn(old, value))
+                result = None
+            elif op == "len":
+                result = len(shard)
+            elif op == "items":
+                result = list(shard)
+            else:
+                raise ValueError(f"Unknown command {op!r}")
+        except Exception as e:
+            conn.send(("error", e))
+        else:
+            conn.send(("ok", result))
+
+
+class ShardedHashMap:
+    def __init__(self, shards=None):
+        """
+        Splits the key space across worker processes by `hash(key) % shards`,
+        one `HashMap` per shard, so hashing and key comparisons run on every core.
+
+        Batched calls (`put_many`, `get_many`, `remove_many`, `aggregate`) send
+        one message to each shard first and only then collect the replies, so
+        the shards work in parallel. Keys and values have to be picklable.
+        """
+        self.shards = shards or os.cpu_count() or 1
+        self._conns = []
+        self._workers = []
+        for _ in range(self.shards):
+            conn, child_conn = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_serve, args=(child_conn,), daemon=True)
+            worker.start()
+            child_conn.close()
+            self._conns.append(conn)
+            self._workers.append(worker)
+
+    def _hash(self, key):
+        """
+        Computes shard index for the key from the high bits of the mixed hash:
+        the shards' HashMaps index buckets by the low bits, routing on those
+        would leave all but 1/shards of every shard's buckets empty.
+        """
+        return (((hash(key) * _MIX) & _MASK) >> 32) % self.shards
+
+    def _partition(self, items, key=None):
+        """
+        Splits `items` into one list per shard, plus the original positions.
+        """
+        parts = [[] for _ in range(self.shards)]
+        positions = [[] for _ in range(self.shards)]
+        for i, item in enumerate(items):
+            index = self._hash(item if key is None else key(item))
+            parts[index].append(item)
+            positions[index].append(i)
+        return parts, positions
+
+    def _broadcast(self, op, parts):
+        """
+        Sends `(op, part)` to every shard with a non-empty part, then collects
+        the results; O(max shard work) wall time.
+        """
+        sent = []
+        try:
+            for index, part in enumerate(parts):
+                if part is None:
+                    continue
+                self._conns[index].send((op, part))
+                sent.append(index)
+        except BaseException:
+            # e.g. an unpicklable key: the shards already sent to still reply,
+            # read those replies or the next calls would receive them
+            for index in sent:
+                self._conns[index].recv()
+            raise
+
+        results = [None] * self.shards
+        error = None
+        for index in sent:
+            status, result = self._conns[index].recv()
+            if status == "error":
+                error = result
+            results[index] = result
+        if error is not None:
+            raise error
+        return results
+
+    def _gather(self, op, keys):
+        keys = list(keys)
+        parts, positions = self._partition(keys)
+        results = self._broadcast(op, [part or None for part in parts])
+
+        values = [None] * len(keys)
+        for index, part_positions in enumerate(positions):
+            for i, value in zip(part_positions, results[index] or []):
+                values[i] = value
+        return values
+
+    def put_many(self, items):
+        """
+        Inserts or updates every pair of a mapping or an iterable of pairs.
+        """
+        if hasattr(items, "items"):
+            items = items.items()
+        parts, _ = self._partition(items, key=operator.itemgetter(0))
+        self._broadcast("put_many", [part or None for part in parts])
+        return True
+
+    def get_many(self, keys):
+        """
+        Returns the values of `keys` in order, None for missing ones.
+        """
+        return self._gather("get_many", keys)
+
+    def remove_many(self, keys):
+        """
+        Removes `keys` and returns their values in order, None for missing ones.
+        """
+        return self._gather("remove_many", keys)
+
+    def aggregate(self, items, fn=operator.add):
+        """
+        Folds every `(key, value)` pair into the map: inserts `value` for a new
+        key, otherwise stores `fn(old, value)`. `fn` must be picklable, e.g. a
+        module-level function; the default counts or sums values.
+        """
+        parts, _ = self._partition(items, key=operator.itemgetter(0))
+        self._broadcast("aggregate", [(part, fn) if part else None for part in parts])
+        return True
+
+    def put(self, key, value):
+        return self.put_many([(key, value)])
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def remove(self, key):
+        return self.remove_many([key])[0]
+
+    def close(self):
+        """
+        Stops the worker processes; the map is unusable afterwards.
+        """
+        for conn, worker in zip(self._conns, self._workers):
+            if worker.is_alive():
+                conn.send(("close", None))
+            worker.join()
+            conn.close()
+        self._conns = []
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __setitem__(self, key, val):
+        self.put(key, val)
+
+    def __delitem__(self, key):
+        self.remove(key)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return sum(self._broadcast("len", [True] * self.shards))
+
+    def __iter__(self):
+        for items in self._broadcast("items", [True] * self.shards):
+            yield from items
+
+
+if __name__ == "__main__":
+    import pickle
+
+    with ShardedHashMap(shards=4) as hashmap:
+        hashmap.put("apple", 1)
+        hashmap.put("banana", 2)
+        hashmap["orange"] = 3
+        hashmap["banana"] = 10  # update
+
+        assert hashmap.get("apple") == 1
+        assert hashmap["banana"] == 10
+        assert hashmap.remove("orange") == 3
+        assert hashmap.remove("notfound") is None
+        assert "banana" in hashmap
+        del hashmap["banana"]
+        assert "banana" not in hashmap
+
+        hashmap.put_many({i: i * i for i in range(1000)})
+        assert hashmap.get_many([3, 999, "missing"]) == [9, 999 * 999, None]
+        assert len(hashmap) == 1001
+
+        words = ["a", "b", "a", "c", "a", "b"] * 100
+        hashmap.aggregate((word, 1) for word in words)
+        assert hashmap.get_many(["a", "b", "c"]) == [300, 200, 100]
+        assert dict(hashmap)["apple"] == 1
+
+        # a failed send leaves no stale replies behind: fail on the last shard
+        last = next(key for key in range(100) if hashmap._hash(key) == hashmap.shards - 1)
+        sent = [key for key in range(100) if hashmap._hash(key) < hashmap.shards - 1][:10]
+        try:
+            hashmap.put_many([(key, "new") for key in sent] + [(last, lambda: "unpicklable")])
+        except pickle.PicklingError:
+            pass
+        else:
+            raise AssertionError("put_many sent an unpicklable value")
+        assert hashmap.get_many(sent + [last]) == ["new"] * len(sent) + [last * last]
+        assert len(hashmap) == 1004
+
+    print("OK!")
@@ -0,0 +1,72 @@
+"""
+Binary snapshot format shared by the `dump(fp)` / `load(fp)` methods.
+
+    magic | block(kind, meta, count) | block(entries) ... | end marker
+
+A block is a little-endian u32 byte length and a pickle; entries are written
+`CHUNK_SIZE` at a time, so neither side holds more than one chunk of encoded
+data. Snapshots are pickles: only load ones you trust.
+"""
+import itertools
+import pickle
+import struct
+
+MAGIC = b"DSSNAP1\n"
+CHUNK_SIZE = 4096
+
+_LENGTH = struct.Struct("<I")
+
+
+def _write_block(fp, obj):
+    data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    fp.write(_LENGTH.pack(len(data)))
+    fp.write(data)
+
+
+def _read_block(fp):
+    header = fp.read(_LENGTH.size)
+    if len(header) < _LENGTH.size:
+        raise ValueError("Truncated snapshot")
+    length, = _LENGTH.unpack(header)
+    if not length:
+        return None
+    data = fp.read(length)
+    if len(data) < length:
+        raise ValueError("Truncated snapshot")
+    return pickle.loads(data)
+
+
+def dump(fp, kind, meta, count, entries):
+    """
+    Writes a snapshot of `count` entries to the binary file `fp`.
+    """
+    fp.write(MAGIC)
+    _write_block(fp, (kind, meta, count))
+    entries = iter(entries)
+    while True:
+        chunk = list(itertools.islice(entries, CHUNK_SIZE))
+        if not chunk:
+            break
+        _write_block(fp, chunk)
+    fp.write(_LENGTH.pack(0))
+
+
+def load(fp, kind):
+    """
+    Reads a snapshot header, returns `(meta, count, entries)` where `entries`
+    lazily reads the rest of the snapshot one chunk at a time.
+    """
+    if fp.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a snapshot")
+    stored_kind, meta, count = _read_block(fp)
+    if stored_kind != kind:
+        raise ValueError(f"Snapshot holds a {stored_kind!r}, expected {kind!r}")
+
+    def entries():
+        while True:
+            chunk = _read_block(fp)
+            if chunk is None:
+                return
+            yield from chunk
+
+    return meta, count, entries()
@@ -1,3 +1,6 @@
+import collections
+
+
 class Stack:
     def __init__(self):
         self._buffer = []
@@ -23,6 +26,24 @@ class Stack:
     def __len__(self):
         return len(self._buffer)
 
+
+class WorkStealingDeque(Stack):
+    def __init__(self):
+        """
+        Stack shared by one owner thread, which pushes and pops at the top, and
+        thieves, which steal the oldest elements from the bottom. The buffer is
+        a `collections.deque`, whose append, pop and popleft are atomic, so
+        neither end takes a lock. `pop` and `steal` raise IndexError when empty.
+        """
+        self._buffer = collections.deque()
+
+    def steal(self):
+        """
+        Deletes the first element from the `buffer` and returns it; O(1)
+        """
+        return self._buffer.popleft()
+
+
 if __name__ == "__main__":
     s = Stack()
     s.push(1)
@@ -34,4 +55,35 @@ if __name__ == "__main__":
     assert s.get() == 1
     assert s.pop() == 1
     assert s.get() is None
+
+    import threading
+
+    d = WorkStealingDeque()
+    for i in range(4):
+        d.push(i)
+    assert d.pop() == 3
+    assert d.steal() == 0
+    assert d.get() == 2
+    assert len(d) == 2
+
+    # every element is taken exactly once by the owner or a thief
+    d = WorkStealingDeque()
+    taken = []
+
+    def take(grab):
+        while True:
+            try:
+                taken.append(grab())
+            except IndexError:
+                return
+
+    for i in range(100_000):
+        d.push(i)
+    thieves = [threading.Thread(target=take, args=(d.steal,)) for _ in range(3)]
+    for thief in thieves:
+        thief.start()
+    take(d.pop)
+    for thief in thieves:
+        thief.join()
+    assert sorted(taken) == list(range(100_000))
     print("OK!")
\ No newline at end of file